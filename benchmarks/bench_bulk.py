@@ -0,0 +1,55 @@
+"""Measures the throughput of :py:mod:`playme.bulk` decoding collection
+messages, in the calling process and on pools of increasing size, and what a
+message costs the workers and the calling process with and without compact
+items.
+
+    prompt $ python benchmarks/bench_bulk.py [messages] [tracks]
+"""
+import cPickle
+import multiprocessing
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme import bulk
+from playme.item import Tracks
+import payloads
+
+
+def costs(message, compact, number=100):
+    """Returns the pickle size, the worker time (decoding and pickling) and
+    the calling process time (unpickling) of **message**, in microseconds."""
+    def best(function):
+        return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+    decode = lambda: bulk._decode(Tracks, compact, message)
+    entity = decode()
+    pickled = cPickle.dumps(entity, 2)
+    worker = best(decode) + best(lambda: cPickle.dumps(entity, 2))
+    caller = best(lambda: cPickle.loads(pickled))
+    return len(pickled), worker * 1e6, caller * 1e6
+
+
+def main(count=2000, tracks=50):
+    messages = [payloads.tracks(tracks)] * count
+    for compact in (True, False):
+        print 'compact=%-5s %6i bytes  worker %5.0fus  caller %5.0fus' % (
+            (compact,) + costs(messages[0], compact))
+    cpus = multiprocessing.cpu_count()
+    for processes in sorted(set((1, 2, cpus))):
+        for compact in (True, False):
+            with bulk.BulkDecoder(processes, chunk_size=16) as decoder:
+                list(decoder.decode(Tracks, messages[:processes * 16]))
+                start = time.time()
+                decoded = sum(1 for collection in decoder.decode(
+                    Tracks, messages, compact=compact))
+                elapsed = time.time() - start
+            print '%i processes  compact=%-5s %8.0f messages/s' % (
+                processes, compact, decoded / elapsed)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,40 @@
+"""Measures the client side overhead of calling a
+:py:class:`playme.core.Method`, with a stub pool answering instantly in place
+of the network.
+
+    prompt $ python benchmarks/bench_calls.py [calls]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme import api
+from playme.core import Request
+from playme.pool import ConnectionPool
+import payloads
+
+
+class StubPool(ConnectionPool):
+    """Answers every request with the same message, without any I/O."""
+    def __init__(self, body):
+        super(StubPool, self).__init__('api.playme.com')
+        self.body = body
+
+    def urlopen(self, path, headers=None, timeout=None):
+        return 200, dict(), self.body
+
+
+def main(calls=20000):
+    Request.pool = StubPool(payloads.artist_get())
+    start = time.time()
+    for i in xrange(calls):
+        api.artist.get(artistCode=1073, country='us', apikey='k')
+    elapsed = time.time() - start
+    print '%i calls  %8.0f calls/s  %6.1f us/call' % (
+        calls, calls / elapsed, elapsed / calls * 1e6)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
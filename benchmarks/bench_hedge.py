@@ -0,0 +1,42 @@
+"""Compares the p50/p99 latency of :py:class:`playme.core.Request` against a
+stub server with a slow tail, without and with a
+:py:class:`playme.hedge.Hedger`.
+
+    prompt $ python benchmarks/bench_hedge.py [calls] [tail] [tail_latency]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme.core import Request
+from playme.hedge import Hedger
+from playme.pool import ConnectionPool
+from stubserver import StubServer
+
+
+def bench(label, calls):
+    latencies = list()
+    for i in xrange(calls):
+        start = time.time()
+        Request('artist.get', artistCode=i, country='us').response
+        latencies.append(time.time() - start)
+    latencies.sort()
+    print '%-8s p50 %7.2f ms  p99 %7.2f ms  mean %7.2f ms' % (
+        label, latencies[calls // 2] * 1e3, latencies[calls * 99 // 100] * 1e3,
+        sum(latencies) / calls * 1e3)
+
+
+def main(calls=2000, tail=0.02, tail_latency=0.1):
+    with StubServer(latency=0.002, tail=float(tail),
+                    tail_latency=float(tail_latency)) as server:
+        Request.pool = ConnectionPool('127.0.0.1', server.port, size=8)
+        bench('plain', calls)
+        Request.hedger = hedger = Hedger()
+        bench('hedged', calls)
+        print 'hedged %(hedged)i of %(calls)i calls, %(won)i won' % hedger.stats
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 2000, *sys.argv[2:])
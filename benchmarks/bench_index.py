@@ -0,0 +1,37 @@
+"""Measures the lookup time of :py:class:`playme.index.SearchIndex` over a
+large set of artists, for whole words and for the short prefixes typed in an
+autocomplete field.
+
+    prompt $ python benchmarks/bench_index.py [artists]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme.index import SearchIndex
+from playme.item import Artist
+
+WORDS = ('pink', 'floyd', 'black', 'sabbath', 'the', 'rolling', 'stones',
+         'daft', 'punk', 'beyonc\xc3\xa9', 'massive', 'attack', 'radio', 'head')
+
+
+def main(count=100000, repeat=1000):
+    artists = [Artist(artistCode=i, name='%s %s %i' % (
+        WORDS[i % len(WORDS)], WORDS[i // len(WORDS) % len(WORDS)], i))
+        for i in xrange(count)]
+    start = time.time()
+    index = SearchIndex(artists)
+    index.search(WORDS[0], limit=1)  # sorts the index
+    print 'index %i artists  %8.1f ms' % (count, (time.time() - start) * 1e3)
+    for query in ('massive attack 1', 'rolling 4242', 'beyonce pu', 'da'):
+        start = time.time()
+        for i in xrange(repeat):
+            results = index.search(query, limit=10)
+        print '%-18r %6i results  %8.3f ms' % (
+            query, len(results), (time.time() - start) / repeat * 1e3)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,28 @@
+"""Measures how long :py:meth:`playme.item.ItemsCollection.fromResponseMessage`
+takes to build large collections out of a parsed response message.
+
+    prompt $ python benchmarks/bench_items.py [items]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme.core import Response
+from playme.item import Tracks
+import payloads
+
+
+def main(count=10000, repeat=5):
+    response = Response(payloads.tracks(count))
+    best = float('inf')
+    for i in xrange(repeat):
+        start = time.time()
+        tracks = Tracks.fromResponseMessage(response)
+        best = min(best, time.time() - start)
+    print '%i tracks  %8.1f ms' % (len(tracks), best * 1e3)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,41 @@
+"""Compares the time needed to build a :py:class:`playme.core.Response` with
+each of the json backends installed.
+
+    prompt $ python benchmarks/bench_json.py [repeat]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme.core import Response
+import payloads
+
+MESSAGES = (
+    ('artist.get', payloads.artist_get()),
+    ('album.getTracks', payloads.album_get_tracks(count=30)),
+    ('searchByName', payloads.artist_search(count=500)),
+)
+
+
+def main(repeat=200):
+    default = Response.json_backend
+    for backend in Response.json_backends:
+        try:
+            Response.use_json(backend)
+        except ImportError:
+            print '%-10s not installed' % backend
+            continue
+        for label, message in MESSAGES:
+            start = time.time()
+            for i in xrange(repeat):
+                Response(message)
+            elapsed = (time.time() - start) / repeat
+            print '%-10s %-16s %7i bytes  %8.1f us' % (
+                backend, label, len(message), elapsed * 1e6)
+    Response.use_json(default)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""Compares the memory used by :py:class:`playme.item.Track` against
+:py:class:`playme.item.CompactTrack`, measuring the resident set size growth
+of a child process building the tracks.
+
+    prompt $ python benchmarks/bench_memory.py [tracks]
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme.item import Track, CompactTrack
+
+
+def records(count):
+    return json.loads(json.dumps([
+        {'trackCode': i, 'name': 'Track %i' % i, 'duration': 180 + i % 60,
+         'albumCode': i % 1000, 'artistCode': i % 100, 'country': 'us'}
+        for i in xrange(count)]))
+
+
+def rss():
+    """The current resident set size in KiB (Linux only)."""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024
+
+
+def measure(cls, count):
+    """Returns the RSS growth in KiB caused by building **count** items."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid:
+        os.close(write)
+        growth = int(os.read(read, 64))
+        os.waitpid(pid, 0)
+        return growth
+    data = records(count)
+    before = rss()
+    items = [cls(**r) for r in data]
+    after = rss()
+    os.write(write, str(after - before))
+    os._exit(0)
+
+
+def main(count=200000):
+    full = measure(Track, count)
+    compact = measure(CompactTrack, count)
+    for label, kib in (('Track', full), ('CompactTrack', compact)):
+        print '%-13s %7i tracks  %8i KiB  %6i bytes/track' % (
+            label, count, kib, kib * 1024 / count)
+    print 'saving        %.2fx' % (float(full) / compact)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""Compares the per-call latency of :py:class:`playme.core.Request` opening a
+fresh connection for every call, as ``urllib2.urlopen`` does, against the
+keep-alive :py:class:`playme.pool.ConnectionPool`.
+
+    prompt $ python benchmarks/bench_pool.py [calls]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme.core import Request
+from playme.pool import ConnectionPool
+from stubserver import StubServer
+
+
+class NoKeepAlivePool(ConnectionPool):
+    """Closes every connection after use, like ``urllib2.urlopen``."""
+    def _put(self, connection):
+        connection.close()
+
+
+def bench(label, call, calls):
+    start = time.time()
+    for i in xrange(calls):
+        call()
+    elapsed = time.time() - start
+    print '%-10s %6i calls  %8.1f us/call' % (label, calls, elapsed / calls * 1e6)
+    return elapsed
+
+
+def main(calls=2000):
+    with StubServer() as server:
+        def call():
+            Request('artist.get', artistCode=1073, country='us').response
+
+        Request.pool = NoKeepAlivePool('127.0.0.1', server.port)
+        fresh = bench('fresh', call, calls)
+        Request.pool = ConnectionPool('127.0.0.1', server.port, size=4)
+        keepalive = bench('pool', call, calls)
+        print 'speedup    %.2fx' % (fresh / keepalive)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,69 @@
+"""Response messages shaped like the ones returned by the playMe API, used
+by the benchmarks and the stub server.
+"""
+import json
+
+
+def artist(code):
+    return {'artistCode': code, 'name': u'Artist \xe8 %i' % code,
+            'country': 'us', 'genre': 'Rock',
+            'image': 'http://img.playme.com/artist/%i.jpg' % code,
+            'url': 'http://www.playme.com/artist/%i' % code}
+
+
+def album(code):
+    return {'albumCode': code, 'name': u'Album \xe8 %i' % code,
+            'artistCode': code % 1000, 'artistName': 'Artist %i' % (code % 1000),
+            'country': 'us', 'genre': 'Rock', 'releaseDate': '2011-07-22',
+            'image': 'http://img.playme.com/album/%i.jpg' % code,
+            'url': 'http://www.playme.com/album/%i' % code}
+
+
+def track(code):
+    return {'trackCode': code, 'name': u'Track \xe8 %i' % code,
+            'albumCode': code // 12, 'albumName': 'Album %i' % (code // 12),
+            'artistCode': code % 1000, 'artistName': 'Artist %i' % (code % 1000),
+            'country': 'us', 'duration': 180 + code % 120,
+            'trackNumber': code % 12 + 1, 'genre': 'Rock',
+            'url': 'http://www.playme.com/track/%i' % code}
+
+
+def message(response):
+    return json.dumps({'response': response})
+
+
+NOT_FOUND = message({'error': {'code': '14040', 'description': 'API not found'}})
+NO_RESULTS = message({'error': {'code': '13000', 'description': 'No results'}})
+
+
+def artist_get(code=1073):
+    """An *artist.get* response message."""
+    return message({'artist': artist(code)})
+
+
+def album_get(code=421, count=12):
+    """An *album.get* response message, embedding **count** tracks."""
+    return message({'album': album(code), 'tracks': {'track': [
+        track(code * 12 + i) for i in xrange(count)]}})
+
+
+def artist_get_albums(code=1073, count=12):
+    """An *artist.getAlbums* response message with **count** albums."""
+    return message({'albums': [{'album': album(code * 100 + i)}
+                               for i in xrange(count)]})
+
+
+def album_get_tracks(code=421, count=12):
+    """An *album.getTracks* response message with **count** tracks."""
+    return message({'tracks': [{'track': track(code * 12 + i)}
+                               for i in xrange(count)]})
+
+
+def artist_search(count=50):
+    """An *artist.searchByName* response message with **count** artists."""
+    return message({'artists': [{'artist': artist(i)} for i in xrange(count)]})
+
+
+def tracks(count=1000):
+    """A response message with a collection of **count** tracks."""
+    return message({'tracks': [{'track': track(i)} for i in xrange(count)]})
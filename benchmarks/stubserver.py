@@ -0,0 +1,155 @@
+"""A local stub of the playMe API host, serving canned json responses over
+HTTP/1.1 keep-alive connections. Used by the benchmarks, so that they can run
+without network access and without an apikey.
+
+Unless a fixed **body** is given, the response message is chosen by API
+method among :py:data:`ROUTES`, with **size** items in the collections, and
+only the first page exists; every response is delayed by **latency** seconds,
+to mimic the network round trip, and a **tail** fraction of them by
+**tail_latency** more seconds, to mimic a slow backend.
+Unknown methods get the *API not found* error. With **compress**, responses
+are gzip encoded for the clients accepting it. Every response carries *ETag*
+and *Last-Modified* validators, and conditional requests for an unchanged
+message get *304 Not Modified*.
+
+    prompt $ python benchmarks/stubserver.py [port] [latency] [size] [compress]
+"""
+import gzip
+import hashlib
+import random
+import socket
+import sys
+import threading
+import time
+from cStringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs
+
+import payloads
+
+ARTIST = payloads.artist_get()
+LAST_MODIFIED = 'Fri, 22 Jul 2011 10:00:00 GMT'
+
+ROUTES = {
+    'artist.get': lambda size: payloads.artist_get(),
+    'album.get': lambda size: payloads.album_get(count=size),
+    'album.getTracks': lambda size: payloads.album_get_tracks(count=size),
+    'artist.getAlbums': lambda size: payloads.artist_get_albums(count=size),
+    'artist.searchByName': lambda size: payloads.artist_search(count=size),
+}
+
+
+def gzipped(body):
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as f:
+        f.write(body)
+    return buf.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer the status line and headers, so that they leave in one segment,
+    # and don't let Nagle's algorithm hold back the tail of large bodies.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        latency = self.server.latency
+        if self.server.tail and random.random() < self.server.tail:
+            latency += self.server.tail_latency
+        if latency:
+            time.sleep(latency)
+        body = self.server.body
+        if body is None:
+            method, _, query = self.path.lstrip('/').partition('?')
+            body = self.server.bodies.get(method, payloads.NOT_FOUND)
+            if int(parse_qs(query).get('page', ['1'])[0]) > 1:
+                body = payloads.NO_RESULTS
+        etag = self.server.etag(body)
+        if (self.headers.get('If-None-Match') == etag or
+                self.headers.get('If-Modified-Since') == LAST_MODIFIED):
+            self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Type', 'application/json')
+        if (self.server.compress and
+                'gzip' in self.headers.get('Accept-Encoding', '')):
+            body = self.server.gzipped(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """A threaded stub server listening on **port**, a free localhost port
+    by default. Use it as a context manager to run it in a background
+    thread."""
+    daemon_threads = True
+
+    def __init__(self, body=None, latency=0, size=50, port=0, compress=False,
+                 tail=0, tail_latency=0.2):
+        HTTPServer.__init__(self, ('127.0.0.1', port), StubHandler)
+        self.body = body
+        self.latency = latency
+        self.tail = tail
+        self.tail_latency = tail_latency
+        self.compress = compress
+        self.bodies = dict((m, route(size)) for m, route in ROUTES.items())
+        self.not_modified = 0
+        self._gzipped = dict()
+        self._etags = dict()
+
+    def etag(self, body):
+        """The *ETag* of **body**, computed once."""
+        try:
+            return self._etags[body]
+        except KeyError:
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            return self._etags.setdefault(body, etag)
+
+    def gzipped(self, body):
+        """The gzip encoding of **body**, computed once."""
+        try:
+            return self._gzipped[body]
+        except KeyError:
+            return self._gzipped.setdefault(body, gzipped(body))
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on slow responses are expected.
+        if not isinstance(sys.exc_info()[1], socket.error):
+            HTTPServer.handle_error(self, request, client_address)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def main(port=8080, latency=0, size=50, compress=''):
+    server = StubServer(latency=float(latency), size=int(size), port=int(port),
+                        compress=bool(compress))
+    print 'Serving on http://127.0.0.1:%i/' % server.port
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
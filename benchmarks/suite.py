@@ -0,0 +1,122 @@
+"""The offline benchmark suite: runs the main client code paths against a
+local :py:class:`stubserver.StubServer` and reports throughput, p50/p99
+latency and resident memory growth for each of them. It first checks that
+expired cached messages are revalidated against the stub validators.
+
+    prompt $ python benchmarks/suite.py --latency 0.005 --size 100 --threads 8
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playme import api
+from playme.cache import MemoryCache, SqliteCache
+from playme.core import Request, Response
+from playme.item import Album, Artist, Artists, Tracks
+from playme.pool import ConnectionPool
+from bench_memory import rss
+from stubserver import StubServer
+import payloads
+
+
+def scenarios(size):
+    search = payloads.artist_search(count=size)
+    tracks = payloads.album_get_tracks(count=size)
+    return (
+        ('Method.__call__ artist.get',
+         lambda i: api.artist.get(artistCode=i, country='us')),
+        ('Method.__call__ album.getTracks',
+         lambda i: api.album.getTracks(albumCode=i, country='us')),
+        ('Item.request Artist',
+         lambda i: Artist.request(artistCode=i, country='us')),
+        ('Item.request Album',
+         lambda i: Album.request(albumCode=i, country='us')['tracks']),
+        ('Artists.searchByName',
+         lambda i: Artists.searchByName(query=i, country='us', format='json')),
+        ('fromResponseMessage Artists',
+         lambda i: Artists.fromResponseMessage(Response(search))),
+        ('fromResponseMessage Tracks',
+         lambda i: Tracks.fromResponseMessage(Response(tracks))),
+    )
+
+
+def check_revalidation(server):
+    """Asserts that an expired cached message is revalidated with a
+    conditional request, answered by *304 Not Modified*, with every cache
+    backend."""
+    for cache in (MemoryCache(ttl=0.05), SqliteCache(':memory:', ttl=0.05)):
+        Request.cache = cache
+        not_modified = server.not_modified
+        first = api.artist.get(artistCode=1, country='us')
+        time.sleep(0.1)
+        again = api.artist.get(artistCode=1, country='us')
+        assert again == first
+        assert server.not_modified == not_modified + 1, server.not_modified
+        assert cache.stats['revalidations'] == 1, cache.stats
+        print '%-32s %10s' % ('revalidation ' + type(cache).__name__, 'ok')
+    Request.cache = None
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def run(call, calls, threads):
+    """Runs **call** **calls** times over **threads** threads, and returns
+    the elapsed time and the sorted per-call latencies."""
+    latencies = list()
+
+    def worker(offset):
+        timings = list()
+        for i in xrange(offset, calls, threads):
+            start = time.time()
+            call(i)
+            timings.append(time.time() - start)
+        latencies.extend(timings)
+
+    workers = [threading.Thread(target=worker, args=(n,))
+               for n in xrange(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.time() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='stub server latency, in seconds')
+    parser.add_argument('--size', type=int, default=50,
+                        help='items in the stub collections')
+    parser.add_argument('--compress', action='store_true',
+                        help='gzip encode the stub responses')
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency, size=args.size,
+                    compress=args.compress) as server:
+        Request.pool = ConnectionPool('127.0.0.1', server.port,
+                                      size=args.threads)
+        check_revalidation(server)
+        print '%-32s %10s %9s %9s %9s' % (
+            'scenario', 'calls/s', 'p50 ms', 'p99 ms', 'rss KiB')
+        for label, call in scenarios(args.size):
+            before = rss()
+            elapsed, latencies = run(call, args.calls, args.threads)
+            print '%-32s %10.0f %9.3f %9.3f %9i' % (
+                label, args.calls / elapsed,
+                percentile(latencies, 0.50) * 1e3,
+                percentile(latencies, 0.99) * 1e3,
+                rss() - before)
+
+
+if __name__ == '__main__':
+    main()
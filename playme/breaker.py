@@ -0,0 +1,191 @@
+"""This module provides a circuit breaker for :py:class:`playme.core.Request`,
+enabled by assigning it to :py:attr:`playme.core.Request.breaker`::
+
+    import playme.core, playme.breaker
+    playme.core.Request.breaker = playme.breaker.CircuitBreaker(cooldown=30)
+
+Every API method has its own circuit. While the backend works the circuit is
+*closed*, and calls go through. When too many of the recent calls fail, with
+a network error or one of the backend failure statuses (*DB error* and
+*Search engine error* by default) the circuit *opens*: calls fail fast
+raising :py:class:`playme.core.CircuitOpenError`, or are answered with the
+stale cached message, if any. After a cooldown the circuit is *half-open*: a
+few trial calls go through, and the first outcome closes or opens the circuit
+again.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import threading
+import time
+from collections import deque
+from httplib import HTTPException
+
+from playme import core
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+FAILURES = (16000, 20000)
+"""The :py:class:`playme.core.ResponseStatus` codes of backend failures."""
+NETWORK_ERRORS = (EnvironmentError, HTTPException, core.TimeoutError)
+"""The exceptions counted as failures, except
+:py:class:`playme.core.DeadlineError`: the call wasn't made at all."""
+
+
+class Circuit(object):
+    """The circuit of an API method: it opens when at least **failure_rate**
+    of the last **window** calls failed, once **min_calls** of them have
+    been made, and it's half-open **cooldown** seconds later, allowing
+    **probes** concurrent trial calls.
+
+    >>> from playme.breaker import Circuit
+    >>> circuit = Circuit(failure_rate=0.5, window=4, min_calls=4, cooldown=0)
+    >>> for failed in (False, True, False, True):
+    ...     circuit.record(circuit.allow(), failed)
+    >>> circuit.state
+    'open'
+    >>> circuit.allow(), circuit.allow()
+    ('half-open', None)
+    >>> circuit.record('half-open', False)
+    >>> circuit.state
+    'closed'
+    """
+    def __init__(self, failure_rate=0.5, window=20, min_calls=10, cooldown=30,
+                 probes=1):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.probes = probes
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.failures = 0
+        self.opened = None
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'Circuit(%r, failures=%i/%i)' % (
+            self.state, self.failures, len(self.outcomes))
+
+    def allow(self):
+        """Returns the state a call is allowed in, or None if it must not be
+        made."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self.opened < self.cooldown:
+                    return None
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probing >= self.probes:
+                    return None
+                self._probing += 1
+            return self.state
+
+    def record(self, state, failed):
+        """Accounts the outcome of a call allowed in **state**: **failed**
+        is None if it tells nothing about the backend."""
+        with self._lock:
+            if state == HALF_OPEN:
+                self._probing -= 1
+                if self.state != HALF_OPEN or failed is None:
+                    return
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    self.failures = 0
+            elif self.state == CLOSED and failed is not None:
+                if len(self.outcomes) == self.outcomes.maxlen:
+                    self.failures -= self.outcomes[0]
+                self.outcomes.append(failed)
+                self.failures += failed
+                if (len(self.outcomes) >= self.min_calls and
+                        self.failures >= self.failure_rate * len(self.outcomes)):
+                    self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened = time.time()
+
+
+class CircuitBreaker(object):
+    """Keeps a :py:class:`Circuit` for every API method, built with
+    **kwargs**. Responses with a status in **statuses** are failures, as
+    well as the :py:data:`NETWORK_ERRORS` raised by the call; other errors
+    aren't accounted. While a circuit is open the
+    stale cached message is returned if **stale** is True and there is one,
+    otherwise :py:class:`playme.core.CircuitOpenError` is raised.
+    :py:attr:`rejected` counts the calls not made.
+
+    >>> from playme.core import Request, Response
+    >>> from playme.breaker import CircuitBreaker
+    >>> breaker = CircuitBreaker(min_calls=2)
+    >>> request = Request('artist.searchByName', query='x')
+    >>> failure = lambda: Response(
+    ...     '{"response": {"error": {"code": "16000"}}}')
+    >>> for i in range(2):
+    ...     response = breaker.call(request, failure)
+    >>> breaker.call(request, failure)
+    Traceback (most recent call last):
+        ...
+    CircuitOpenError: artist.searchByName circuit is open
+    >>> breaker.stats
+    {'artist.searchByName': 'open'}
+
+    Calls not made because the caller's deadline has passed don't count:
+
+    >>> from playme.core import DeadlineError, deadline
+    >>> breaker = CircuitBreaker(min_calls=2)
+    >>> request = Request('artist.get', artistCode=1)
+    >>> for i in range(2):
+    ...     try:
+    ...         with deadline(-1):
+    ...             breaker.call(request, request.call_timeout)
+    ...     except DeadlineError:
+    ...         pass
+    >>> circuit = breaker.circuit(request)
+    >>> circuit.state, len(circuit.outcomes)
+    ('closed', 0)
+    """
+    def __init__(self, statuses=FAILURES, stale=True, **kwargs):
+        self.statuses = frozenset(statuses)
+        self.stale = stale
+        self.kwargs = kwargs
+        self.rejected = 0
+        self._circuits = dict()
+        self._lock = threading.Lock()
+
+    def circuit(self, request):
+        """The :py:class:`Circuit` of the API method of **request**."""
+        method = str(request.method)
+        try:
+            return self._circuits[method]
+        except KeyError:
+            with self._lock:
+                return self._circuits.setdefault(method, Circuit(**self.kwargs))
+
+    def call(self, request, func):
+        """Returns the :py:class:`playme.core.Response` returned by
+        ``func()``, unless the circuit of **request** is open."""
+        circuit = self.circuit(request)
+        state = circuit.allow()
+        if state is None:
+            self.rejected += 1
+            raise core.CircuitOpenError('%s circuit is open' % request.method)
+        failed = None
+        try:
+            response = func()
+            failed = response.status in self.statuses
+            return response
+        except core.DeadlineError:
+            raise
+        except NETWORK_ERRORS:
+            failed = True
+            raise
+        finally:
+            circuit.record(state, failed)
+
+    @property
+    def stats(self):
+        """A :py:class:`dict` mapping API methods to their circuit state."""
+        return dict((m, c.state) for m, c in self._circuits.items())
@@ -0,0 +1,187 @@
+"""This module decodes large amounts of raw response messages, e.g. read from
+a :py:class:`playme.transport.RecordTransport` directory or a message queue,
+into entities, on a pool of processes::
+
+    from playme import bulk
+    from playme.item import Tracks
+
+    for tracks in bulk.decode(Tracks, messages, processes=4):
+        ...
+
+Decoding is CPU bound, so threads don't speed it up: the messages are split
+in chunks, each parsed by a worker process, and the entities are returned in
+the order of the messages, while the next chunks are being decoded.
+
+Workers can send back :py:class:`playme.item.CompactItem` records instead of
+:py:class:`playme.item.Item`: their pickles are less than half the size, but
+building them costs the workers more than the pickling saves, so they only pay
+off when the entities are kept in memory afterwards, or when the processes are
+connected by a slow channel. ``benchmarks/bench_bulk.py`` measures both.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import itertools
+import multiprocessing
+from collections import deque
+
+from playme import core
+from playme.core import Response
+from playme.item import ItemsCollection
+
+
+def _compacts(cls, response):
+    # The compact items of a collection, built straight from the fields in
+    # the message rather than through a full item each.
+    if not response.status:
+        raise core.Error(str(response.status))
+    compact, label = cls.item_type.compact_type, cls.item_type.label
+    items, seen = list(), set()
+    for raw in response[cls.label]:
+        try:
+            fields = raw[label]
+            if len(raw) != 1 or not isinstance(fields, dict):
+                raise TypeError(fields)
+            item = compact(**fields)
+        except (KeyError, IndexError, TypeError, ValueError):
+            item = cls._cast(raw)
+            item = item and item.compact()
+        if item and item not in seen:
+            seen.add(item)
+            items.append(item)
+    return tuple(items)
+
+
+def _decode(cls, compact, body):
+    try:
+        response = Response(body)
+        if compact and issubclass(cls, ItemsCollection):
+            return _compacts(cls, response)
+        entity = cls.fromResponseMessage(response)
+    except core.Error as e:
+        return e
+    return entity.compact() if compact else entity
+
+
+def _decode_chunk(cls, compact, bodies):
+    return [_decode(cls, compact, body) for body in bodies]
+
+
+def chunks(iterable, size):
+    """Splits **iterable** in lists of **size** elements, the last one
+    possibly shorter.
+
+    >>> from playme.bulk import chunks
+    >>> list(chunks(xrange(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class BulkDecoder(object):
+    """Decodes response messages on a :py:class:`multiprocessing.Pool` of
+    **processes**, one per CPU by default, or in the calling process if
+    **processes** is 1. Messages are sent to the workers in chunks of
+    **chunk_size**, and at most **backlog** chunks per process are in flight,
+    so that memory stays bounded however many messages are decoded.
+
+    >>> from playme.bulk import BulkDecoder
+    >>> from playme.item import Track, Tracks
+    >>> messages = ['{"response": {"tracks": [{"track": {"trackCode": 1}}]}}',
+    ...             '{"response": {"error": {"code": "13000"}}}',
+    ...             '{"response": {"track": {"trackCode": 2, "name": "Two"}}}']
+    >>> with BulkDecoder(processes=2, chunk_size=1) as decoder:
+    ...     list(decoder.decode(Tracks, messages[:2]))
+    ...     list(decoder.decode(Track, messages[2:], compact=True))
+    [Tracks(Track(trackCode = 1)), Error('Item not found',)]
+    [CompactTrack(trackCode = 2, name = u'Two')]
+
+    Nested collections are decoded too:
+
+    >>> from playme.item import Album
+    >>> message = ('{"response": {"album": {"albumCode": 1},'
+    ...            ' "tracks": {"track": [{"trackCode": 2}, {"trackCode": 3}]}}}')
+    >>> with BulkDecoder(processes=2) as decoder:
+    ...     [album['tracks'] for album in decoder.decode(Album, [message])]
+    ...     [album['tracks'] for album in decoder.decode(Album, [message],
+    ...                                                  compact=True)]
+    [Tracks(Track(trackCode = 2), Track(trackCode = 3))]
+    [(CompactTrack(trackCode = 2), CompactTrack(trackCode = 3))]
+    """
+    def __init__(self, processes=None, chunk_size=64, backlog=2):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.backlog = backlog
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def pool(self):
+        """The :py:class:`multiprocessing.Pool`, started at the first use."""
+        if self._pool is None and self.processes > 1:
+            self._pool = multiprocessing.Pool(self.processes)
+        return self._pool
+
+    def close(self):
+        """Stops the worker processes."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def decode(self, cls, bodies, compact=False):
+        """Returns a generator decoding every response message in **bodies**
+        as **cls**, either an :py:class:`playme.item.Item` or an
+        :py:class:`playme.item.ItemsCollection` subclass, in the same order.
+
+        If **compact** is True items are decoded as
+        :py:class:`playme.item.CompactItem`, nested collections included, and
+        collections as :py:class:`tuple` of them; otherwise as **cls**. Messages that can't
+        be decoded yield the :py:class:`playme.core.Error` raised in their
+        place, like :py:meth:`playme.item.Item.request_many`.
+        """
+        if self.pool is None:
+            return (_decode(cls, compact, body) for body in bodies)
+        return self._decode(cls, compact, bodies)
+
+    def _decode(self, cls, compact, bodies):
+        pending = deque()
+        window = self.processes * self.backlog
+        for chunk in chunks(bodies, self.chunk_size):
+            pending.append(self.pool.apply_async(
+                _decode_chunk, (cls, compact, chunk)))
+            if len(pending) >= window:
+                for entity in pending.popleft().get():
+                    yield entity
+        while pending:
+            for entity in pending.popleft().get():
+                yield entity
+
+
+def decode(cls, bodies, compact=False, **kwargs):
+    """Returns a generator decoding the response messages in **bodies** on a
+    :py:class:`BulkDecoder` built with **kwargs**, and closed once they are
+    all decoded. See :py:meth:`BulkDecoder.decode`.
+
+    >>> from playme import bulk
+    >>> from playme.item import Artist
+    >>> list(bulk.decode(Artist, ['{"response": {"artist": {"artistCode": 1}}}',
+    ...                           'spam'], processes=1))
+    [Artist(artistCode = 1), ResponseError(u'Invalid Json response message.',)]
+    """
+    decoder = BulkDecoder(**kwargs)
+    try:
+        for entity in decoder.decode(cls, bodies, compact):
+            yield entity
+    finally:
+        decoder.close()
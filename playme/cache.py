@@ -0,0 +1,275 @@
+"""This module provides response caches for :py:class:`playme.core.Request`.
+A cache is enabled by assigning it to :py:attr:`playme.core.Request.cache`::
+
+    import playme.core, playme.cache
+    playme.core.Request.cache = playme.cache.MemoryCache(ttl=600)
+
+Successful response messages are then stored under a key made of the API
+method and the :py:class:`playme.core.QueryString`, and reused until they
+expire. The *apikey* parameter is left out of the key by default, so that
+different keys share the same cached catalogue.
+
+Expired messages are kept until they are evicted. Those received with an
+*ETag* or a *Last-Modified* header are revalidated: the next request is made
+conditional, and if the API answers *304 Not Modified* the cached message is
+reused, and kept for another time to live. Any expired message can be served
+stale while the API method is failing, see :py:mod:`playme.breaker`.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib import urlencode
+
+
+class Entry(object):
+    """A cached response message **body**, fresh until **expires**, with its
+    **etag** and **modified** validators and, if available, the parsed
+    :py:class:`playme.core.Response`.
+
+    >>> from playme.cache import Entry
+    >>> entry = Entry('{}', 0, etag='"abc"', modified='Fri, 22 Jul 2011')
+    >>> entry.fresh
+    False
+    >>> sorted(entry.validators.items())
+    [('If-Modified-Since', 'Fri, 22 Jul 2011'), ('If-None-Match', '"abc"')]
+    """
+    __slots__ = ('body', 'expires', 'etag', 'modified', 'response')
+
+    def __init__(self, body, expires, etag=None, modified=None, response=None):
+        self.body = body
+        self.expires = expires
+        self.etag = etag
+        self.modified = modified
+        self.response = response
+
+    @property
+    def fresh(self):
+        """Whether the entry can be used without asking the API."""
+        return self.expires >= time.time()
+
+    @property
+    def validators(self):
+        """The headers of a conditional request for the cached message."""
+        headers = dict()
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.modified:
+            headers['If-Modified-Since'] = self.modified
+        return headers
+
+
+class Cache(object):
+    """Base class for response caches. Subclasses implement :py:meth:`_get`
+    and :py:meth:`_set` on top of a storage backend.
+
+    **ttl** is the default time to live in seconds, while **ttls** maps API
+    method names to their own time to live: a time to live of 0 disables
+    caching for that method. Query string parameters listed in **ignore**
+    don't take part in the key.
+
+    >>> from playme.core import Request
+    >>> from playme.cache import Cache
+    >>> cache = Cache(ttls={'artist.get': 3600})
+    >>> cache.key(Request('artist.get', artistCode=1, apikey='k'))
+    'artist.get?artistCode=1'
+    >>> cache.ttl_for('artist.get'), cache.ttl_for('track.get')
+    (3600, 300)
+    """
+    def __init__(self, ttl=300, ttls=None, ignore=('apikey',)):
+        self.ttl = ttl
+        self.ttls = ttls or dict()
+        self.ignore = ignore
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._counters = threading.Lock()
+
+    def key(self, request):
+        """The cache key of **request**."""
+        query = [(k, v) for k, v in request.data.items()
+                 if k not in self.ignore]
+        return '%s?%s' % (request.method, urlencode(query))
+
+    def ttl_for(self, method):
+        """The time to live of **method** responses."""
+        return self.ttls.get(method, self.ttl)
+
+    def lookup(self, request):
+        """Returns the cached :py:class:`Entry` of **request**, or None. The
+        entry may be expired."""
+        entry = None
+        if self.ttl_for(request.method) > 0:
+            entry = self._get(self.key(request), time.time())
+        with self._counters:
+            if entry is not None and entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def get(self, request):
+        """Returns the cached response message of **request**, or None."""
+        entry = self.lookup(request)
+        if entry is not None and entry.fresh:
+            return entry.body
+
+    def set(self, request, body, headers=None, response=None):
+        """Stores **body** as the response message of **request**, along with
+        the validators found in the response **headers** and the parsed
+        **response**."""
+        ttl = self.ttl_for(request.method)
+        if ttl > 0:
+            headers = headers or dict()
+            self._set(self.key(request), Entry(
+                body, time.time() + ttl, headers.get('etag'),
+                headers.get('last-modified'), response))
+
+    def revalidated(self, request, entry):
+        """Keeps **entry** for another time to live, after the API confirmed
+        that it's still the response message of **request**."""
+        with self._counters:
+            self.revalidations += 1
+        entry.expires = time.time() + self.ttl_for(request.method)
+        self._set(self.key(request), entry)
+
+    @property
+    def stats(self):
+        """A :py:class:`dict` with *hits*, *misses* and *revalidations*
+        counters."""
+        with self._counters:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'revalidations': self.revalidations}
+
+    def _get(self, key, now):
+        raise NotImplementedError(type(self).__name__ + '._get')
+
+    def _set(self, key, entry):
+        raise NotImplementedError(type(self).__name__ + '._set')
+
+
+class MemoryCache(Cache):
+    """An in-process, thread-safe, LRU cache holding at most **max_items**
+    response messages and, if given, at most **max_bytes** bytes of them.
+    The parsed responses are kept too, and reused.
+
+    >>> from playme.core import Request
+    >>> from playme.cache import MemoryCache
+    >>> cache = MemoryCache(max_items=2)
+    >>> r1, r2, r3 = [Request('artist.get', artistCode=i) for i in (1, 2, 3)]
+    >>> cache.set(r1, '1'); cache.set(r2, '2')
+    >>> cache.get(r1)
+    '1'
+    >>> cache.set(r3, '3')
+    >>> cache.get(r2) is None
+    True
+    >>> sorted(cache.stats.items())
+    [('hits', 1), ('misses', 1), ('revalidations', 0)]
+    """
+    def __init__(self, max_items=1024, max_bytes=None, **kwargs):
+        super(MemoryCache, self).__init__(**kwargs)
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key, now):
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                return None
+            self._entries[key] = entry
+            return entry
+
+    def _set(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key).body)
+            self._entries[key] = entry
+            self.size += len(entry.body)
+            while self._entries and (len(self._entries) > self.max_items or
+                    self.max_bytes and self.size > self.max_bytes):
+                self.size -= len(self._entries.popitem(last=False)[1].body)
+
+
+class SqliteCache(Cache):
+    """An on-disk LRU cache stored in the sqlite database at **path**, which
+    can be shared by several threads and processes. At most **max_items**
+    response messages are kept. Every thread has its own connection, so
+    with the ``':memory:'`` path every thread has its own, empty, cache.
+
+    >>> from playme.core import Request
+    >>> from playme.cache import SqliteCache
+    >>> cache = SqliteCache(':memory:', max_items=2)
+    >>> r1, r2, r3 = [Request('artist.get', artistCode=i) for i in (1, 2, 3)]
+    >>> cache.set(r1, '1'); cache.set(r2, '2', {'etag': '"2"'})
+    >>> cache.get(r1)
+    '1'
+    >>> cache.set(r3, '3')
+    >>> cache.get(r2) is None
+    True
+    """
+    def __init__(self, path, max_items=100000, **kwargs):
+        super(SqliteCache, self).__init__(**kwargs)
+        self.path = path
+        self.max_items = max_items
+        self._local = threading.local()
+        self._connection  # creates the database, failing early on a bad path
+
+    @property
+    def _connection(self):
+        try:
+            return self._local.connection
+        except AttributeError:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._create(connection)
+            self._local.connection = connection
+            return connection
+
+    @staticmethod
+    def _create(connection):
+        # Every connection to ':memory:' opens its own database.
+        with connection as db:
+            db.execute('CREATE TABLE IF NOT EXISTS cache ('
+                       'key TEXT PRIMARY KEY, expires REAL, '
+                       'accessed REAL, body BLOB, etag TEXT, modified TEXT)')
+            db.execute('CREATE INDEX IF NOT EXISTS cache_accessed '
+                       'ON cache (accessed)')
+            columns = [c[1] for c in db.execute('PRAGMA table_info(cache)')]
+            for column in ('etag', 'modified'):
+                if column not in columns:
+                    db.execute('ALTER TABLE cache ADD COLUMN %s TEXT' % column)
+
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def _get(self, key, now):
+        with self._connection as db:
+            row = db.execute('SELECT body, expires, etag, modified FROM cache '
+                             'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE cache SET accessed = ? WHERE key = ?',
+                       (now, key))
+            return Entry(str(row[0]), *row[1:])
+
+    def _set(self, key, entry):
+        with self._connection as db:
+            db.execute('INSERT OR REPLACE INTO cache '
+                       '(key, expires, accessed, body, etag, modified) '
+                       'VALUES (?, ?, ?, ?, ?, ?)',
+                       (key, entry.expires, time.time(),
+                        sqlite3.Binary(entry.body), entry.etag,
+                        entry.modified))
+            db.execute('DELETE FROM cache WHERE key IN (SELECT key FROM '
+                       'cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                       (self.max_items,))
@@ -0,0 +1,238 @@
+"""This module runs API calls in background, so that many of them can be in
+flight at the same time without blocking the caller:
+
+>>> from playme.concurrent import Executor
+>>> executor = Executor(workers=2)
+>>> future = executor.submit(sum, [1, 2, 3])
+>>> future.result(timeout=1)
+6
+>>> executor.map(abs, [-1, -2, 3])
+[1, 2, 3]
+>>> executor.shutdown()
+
+API calls are submitted as :py:class:`AsyncRequest`, or through
+:py:func:`call_async` which mirrors calling a :py:class:`playme.core.Method`.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import sys
+import threading
+from Queue import Queue
+
+from playme import core
+
+
+class Future(object):
+    """The pending result of a call running in background.
+
+    >>> from playme.concurrent import Future
+    >>> f = Future()
+    >>> f.done()
+    False
+    >>> f.result(timeout=0.01)
+    Traceback (most recent call last):
+        ...
+    TimeoutError: Call not completed in 0.01 seconds
+    >>> f.set_result(42)
+    >>> f.done(), f.result()
+    (True, 42)
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = list()
+        self._result = None
+        self._exc_info = None
+
+    def done(self):
+        """True if the call has completed, successfully or not."""
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Waits at most **timeout** seconds for the call to complete, then
+        returns its result or raises its exception. Raises
+        :py:class:`playme.core.TimeoutError` if the call is still running."""
+        self._wait(timeout)
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """Like :py:meth:`result`, but returns the exception raised by the
+        call, or None if it succeeded."""
+        self._wait(timeout)
+        if self._exc_info:
+            return self._exc_info[1]
+
+    def _wait(self, timeout):
+        if not self._event.wait(timeout):
+            raise core.TimeoutError(
+                'Call not completed in %s seconds' % timeout)
+
+    def add_done_callback(self, callback):
+        """Calls **callback** with this future once the call completes, or
+        immediately if it has already completed."""
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._complete()
+
+    def set_exception(self, exc_info):
+        """Completes the future with the **exc_info** triple returned by
+        :py:func:`sys.exc_info`."""
+        self._exc_info = exc_info
+        self._complete()
+
+    def _complete(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, list()
+        for callback in callbacks:
+            callback(self)
+
+
+class Executor(object):
+    """A pool of **workers** daemon threads running the submitted calls.
+    Worker threads are started at the first submission. If **workers** is
+    None, a thread is started whenever no worker is idle, so that calls
+    never wait for one.
+
+    When **max_pending** is given, at most that many calls may be submitted
+    and not yet completed: further submissions block until a slot is free,
+    so that a producer can't queue an unbounded amount of work.
+    """
+    def __init__(self, workers=16, max_pending=None):
+        self.workers = workers
+        self._queue = Queue()
+        self._threads = list()
+        self._lock = threading.Lock()
+        self._idle = 0
+        self._pending = None
+        if max_pending:
+            self._pending = threading.BoundedSemaphore(max_pending)
+
+    def __repr__(self):
+        return 'Executor(workers=%r)' % self.workers
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            future, func, args, kwargs, deadline = task
+            result = exc_info = None
+            try:
+                if deadline is None:
+                    result = func(*args, **kwargs)
+                else:
+                    with core.deadline(at=deadline):
+                        result = func(*args, **kwargs)
+            except:
+                exc_info = sys.exc_info()
+            if self._pending:
+                self._pending.release()
+            if self.workers is None:
+                # Idle before the future completes, so that the next call
+                # of its caller doesn't start a thread for nothing.
+                with self._lock:
+                    self._idle += 1
+            if exc_info is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc_info)
+
+    def submit(self, func, *args, **kwargs):
+        """Schedules ``func(*args, **kwargs)`` and returns its
+        :py:class:`Future`. The call runs within the
+        :py:func:`playme.core.deadline` of the caller, if any."""
+        if self._pending:
+            self._pending.acquire()
+        future = Future()
+        self._queue.put((future, func, args, kwargs, core.current_deadline()))
+        if self.workers is None:
+            self._grow()
+        elif len(self._threads) < self.workers:
+            self._start()
+        return future
+
+    def _grow(self):
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+                return
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def map(self, func, iterable, timeout=None):
+        """Runs **func** on every element of **iterable** concurrently and
+        returns the results as a :py:class:`list`, in input order.
+        **timeout** applies to each call."""
+        futures = [self.submit(func, item) for item in iterable]
+        return [f.result(timeout) for f in futures]
+
+    def shutdown(self, wait=True):
+        """Stops the worker threads once the submitted calls are done."""
+        with self._lock:
+            threads, self._threads = self._threads, list()
+            for thread in threads:
+                self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+executor = Executor()
+"""The default :py:class:`Executor` for background API calls."""
+
+
+class AsyncRequest(core.Request):
+    """A :py:class:`playme.core.Request` performed in background by
+    :py:attr:`executor` as soon as it's built. The :py:class:`Response` is
+    returned by :py:meth:`result`, which waits at most **timeout** seconds:
+
+    >>> from playme.concurrent import AsyncRequest, Future
+    >>> from playme.transport import Transport
+    >>> class StubTransport(Transport):
+    ...     def urlopen(self, request, headers=None, timeout=None):
+    ...         return 200, {}, '{"response": {"artist": {"artistCode": 1073}}}'
+    >>> class StubRequest(AsyncRequest):
+    ...     transport = StubTransport()
+    >>> r = StubRequest('artist.get', artistCode=1073, country='us')
+    >>> isinstance(r.future, Future)
+    True
+    >>> r.result(timeout=1)['artist']
+    {u'artistCode': 1073}
+    """
+    executor = executor
+
+    def __init__(self, api_method, query_string=None, **kwargs):
+        super(AsyncRequest, self).__init__(api_method, query_string, **kwargs)
+        self.future = self.executor.submit(getattr, self, 'response')
+
+    def result(self, timeout=None):
+        """The :py:class:`playme.core.Response`, as soon as available."""
+        return self.future.result(timeout)
+
+
+def call_async(method, **query):
+    """Calls the API **method** in background and returns a :py:class:`Future`
+    of its :py:class:`playme.core.Response`. It's the non blocking version of
+    calling a :py:class:`playme.core.Method`."""
+    query['format'] = 'json'
+    return AsyncRequest(method, query).future
@@ -3,9 +3,16 @@
 import playme
 __license__, __author__ = playme.__license__, playme.__author__
 
+from contextlib import contextmanager
+from httplib import HTTPException, NOT_MODIFIED
 from urllib import urlencode
-from urllib2 import urlopen, HTTPError
 import json
+import socket
+import sys
+import threading
+import time
+
+from playme.pool import ConnectionPool
 
 class Error(Exception):
     """Base play.me API error.
@@ -31,6 +38,26 @@ class ResponseError(Error):
     """Represents errors occurred while parsing the response messages."""
 
 
+class TimeoutError(Error):
+    """Represents a call that did not complete in the given time."""
+
+
+class DeadlineError(TimeoutError):
+    """Represents a call not made, because the :py:func:`deadline` of the
+    caller had already passed."""
+
+
+class CircuitOpenError(Error):
+    """Represents a call not made, because its API method is failing. See
+    :py:mod:`playme.breaker`."""
+
+
+CALL_ERRORS = (Error, EnvironmentError, HTTPException)
+"""The exceptions an API call can raise because of the API or the network,
+rather than of a bug: code reporting the failures of many calls one by one
+catches these."""
+
+
 class ResponseStatus(int):
     """Represents response message status code. Casting a
     :py:class:`ResponseStatus` to :py:class:`str` returns the description
@@ -177,13 +204,45 @@ class Response(dict):
     Traceback (most recent call last):
         ...
     ResponseError: Invalid Json response message.
+
+    Messages are decoded by :py:attr:`decoder`, the *loads* function of the
+    fastest json module available among :py:attr:`json_backends`. Use
+    :py:meth:`use_json` to pick a specific one.
     """
+    json_backends = ('orjson', 'ujson', 'simdjson', 'simplejson', 'json')
+    json_backend = 'json'
+    decoder = staticmethod(json.loads)
+
     def __init__(self, response):
         try:
-            self.update(json.loads(response)['response'])
+            self.update(self.decoder(response)['response'])
         except (ValueError, KeyError, TypeError):
             raise ResponseError(u'Invalid Json response message.')
 
+    @classmethod
+    def use_json(cls, name=None):
+        """Selects the json module **name** to decode response messages, or
+        the first available one among :py:attr:`json_backends` if **name**
+        is None. Returns the selected name.
+
+        >>> Response.use_json('json')
+        'json'
+        >>> Response.use_json('spam')
+        Traceback (most recent call last):
+            ...
+        ImportError: No module named spam
+        """
+        for backend in (name,) if name else cls.json_backends:
+            try:
+                module = __import__(backend)
+            except ImportError:
+                if name:
+                    raise
+                continue
+            cls.decoder = staticmethod(module.loads)
+            cls.json_backend = backend
+            return backend
+
     def __str__(self):
         s = json.dumps({ 'response': self }, sort_keys=True, indent=4)
         return '\n'.join([l.rstrip() for l in  s.splitlines()])
@@ -201,6 +260,8 @@ class Response(dict):
     def __repr__(self):
         return '{0}(...)'.format(type(self).__name__)
 
+Response.use_json()
+
 
 class QueryString(dict):
     """A class representing the keyword arguments to be used in HTTP requests
@@ -230,7 +291,7 @@ class QueryString(dict):
         items = items or dict()
         super(QueryString, self).__init__(items, **kwargs)
         for k in self:
-            self[k] = str(self[k]).encode('utf-8')
+            self[k] = _encode(self[k])
 
     def __str__(self):
         return urlencode(self)
@@ -283,6 +344,194 @@ class QueryString(dict):
         return cmp(hash(self), hash(other))
 
 
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+class FrozenQueryString(QueryString):
+    """An immutable :py:class:`QueryString`: values are encoded, keys sorted
+    and the urlencoded string and hash computed once, at construction. It's
+    what :py:class:`Request` uses, so that request identity checks don't
+    repeat that work.
+
+    >>> from playme.core import FrozenQueryString
+    >>> q = FrozenQueryString({'country': 'it', 'albumCode': 1}, query=u'caf\xe8')
+    >>> str(q)
+    'albumCode=1&country=it&query=caf%C3%A8'
+    >>> q.keys()
+    ('albumCode', 'country', 'query')
+    >>> q == QueryString(country='it', albumCode=1, query=u'caf\xe8')
+    True
+    >>> q['country'] = 'us'
+    Traceback (most recent call last):
+        ...
+    TypeError: FrozenQueryString is immutable
+    """
+    def __init__(self, items=None, **kwargs):
+        dict.__init__(self, items or dict(), **kwargs)
+        for k, v in dict.items(self):
+            dict.__setitem__(self, k, _encode(v))
+        self._keys = tuple(sorted(dict.iterkeys(self)))
+        self._items = tuple((k, dict.__getitem__(self, k)) for k in self._keys)
+        self._str = urlencode(self._items)
+        self._hash = hash(self._str)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return tuple(v for k, v in self._items)
+
+    def items(self):
+        return self._items
+
+    def __str__(self):
+        return self._str
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (type(self), (dict(self._items),))
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('%s is immutable' % type(self).__name__)
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+
+class SingleFlight(object):
+    """Coalesces concurrent identical calls: while a call with a given key is
+    in flight, further calls with the same key wait for its outcome instead
+    of running again. :py:attr:`saved` counts the calls spared this way.
+
+    >>> from playme.core import SingleFlight
+    >>> flight = SingleFlight()
+    >>> flight.do('key', lambda: 42)
+    42
+    >>> flight.saved
+    0
+
+    A :py:class:`TimeoutError` belongs to the :py:func:`deadline` of the
+    call raising it: the waiting calls make the call again, rather than
+    raising it too.
+
+    >>> import threading
+    >>> from playme.core import TimeoutError
+    >>> started, release = threading.Event(), threading.Event()
+    >>> def late():
+    ...     started.set()
+    ...     release.wait()
+    ...     raise TimeoutError('late')
+    >>> def lead():
+    ...     try:
+    ...         flight.do('key', late)
+    ...     except TimeoutError:
+    ...         pass
+    >>> threading.Thread(target=lead).start()
+    >>> started.wait()
+    True
+    >>> threading.Timer(0.05, release.set).start()
+    >>> flight.do('key', lambda: 42)
+    42
+    >>> flight.saved
+    0
+    """
+    def __init__(self):
+        self.saved = 0
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Returns ``func()``, or the result of the call with the same **key**
+        already in flight."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                follower = call is not None
+                if follower:
+                    self.saved += 1
+                else:
+                    call = self._calls[key] = _Call()
+            if not follower:
+                break
+            if not call.event.wait(time_left()):
+                raise TimeoutError('Deadline exceeded waiting for %s' % key)
+            if not call.exc_info:
+                return call.result
+            if not issubclass(call.exc_info[0], TimeoutError):
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            # The deadline of this call may be later: try again.
+            with self._lock:
+                self.saved -= 1
+        try:
+            call.result = func()
+            return call.result
+        except:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = self.exc_info = None
+
+
+_deadline = threading.local()
+
+
+@contextmanager
+def deadline(seconds=None, at=None):
+    """Sets a deadline, **seconds** from now or at the **at** timestamp, for
+    the API calls performed by the current thread within the ``with`` block:
+    once it's passed, they raise :py:class:`TimeoutError`. Deadlines nest,
+    and the earliest one applies. Calls submitted to a
+    :py:class:`playme.concurrent.Executor` carry the deadline along. With
+    neither **seconds** nor **at**, the current deadline is left unchanged.
+
+    >>> from playme.core import deadline, time_left
+    >>> time_left() is None
+    True
+    >>> with deadline(10):
+    ...     with deadline(60):
+    ...         9 < time_left() <= 10
+    True
+    """
+    previous = current_deadline()
+    if at is None and seconds is not None:
+        at = time.time() + seconds
+    if previous is not None:
+        at = previous if at is None else min(at, previous)
+    _deadline.at = at
+    try:
+        yield at
+    finally:
+        _deadline.at = previous
+
+
+def current_deadline():
+    """The timestamp of the current thread deadline, or None."""
+    return getattr(_deadline, 'at', None)
+
+
+def time_left():
+    """The seconds left before the current thread deadline, or None."""
+    at = current_deadline()
+    if at is not None:
+        return at - time.time()
+
+
 class Request(object):
     """This is the main API class. Given a :py:class:`Method` or a method name,
     a :py:class:`QueryString` or a :py:class:`dict`, it can build the API query
@@ -290,9 +539,9 @@ class Request(object):
 
     If **method** is string, try to cast it into a :py:class:`Method`. If
     **query_string** is a :py:class:`dict`, try to cast it into a
-    :py:class:`QueryString`. If **query_string** is not specified, try to
-    use **kwargs** as a :py:class:`dict` and cast it into a
-    :py:class:`QueryString`.
+    :py:class:`FrozenQueryString`, together with **kwargs**. If
+    **query_string** is not specified, try to use **kwargs** as a
+    :py:class:`dict` and cast it into a :py:class:`FrozenQueryString`.
 
     >>> from playme.core import Request, Method, QueryString
     >>> method_name = 'album.get'
@@ -315,37 +564,199 @@ class Request(object):
 
     >>> str(Request('album.get', {'country':'it', 'albumCode':'782378'}))
     'http://api.playme.com/album.get?albumCode=782378&country=it'
+
+    Requests are performed through :py:attr:`pool`, a
+    :py:class:`playme.pool.ConnectionPool` shared by every instance, which
+    reuses keep-alive connections. Replacing it changes the API host:
+
+    >>> from playme.pool import ConnectionPool
+    >>> Request.pool = ConnectionPool('localhost', 8080, size=2)
+    >>> str(Request('album.get', {'country':'it', 'albumCode':'782378'}))
+    'http://localhost:8080/album.get?albumCode=782378&country=it'
+    >>> Request.pool = ConnectionPool('api.playme.com')
+
+    When :py:attr:`cache` is set to a :py:class:`playme.cache.Cache`,
+    successful response messages are looked up there before performing the
+    request, and stored there afterwards. Expired messages with validators
+    are revalidated by a conditional request, and reused if not modified.
+
+    Identical requests issued concurrently by several threads are coalesced
+    by :py:attr:`single_flight`, a :py:class:`SingleFlight`, so that only one
+    of them reaches the API: set it to None to disable coalescing.
+
+    When :py:attr:`rate_limiter` is set to a
+    :py:class:`playme.ratelimit.RateLimiter`, calls are spaced to stay within
+    the apikey quota. When :py:attr:`metrics` is set to a
+    :py:class:`playme.metrics.Metrics`, every call is measured. When
+    :py:attr:`transport` is set to a :py:class:`playme.transport.Transport`,
+    it's used to obtain the response messages in place of :py:attr:`pool`.
+
+    Each call waits at most :py:attr:`timeout` seconds for the API, and
+    never past the current :py:func:`deadline`, then raises
+    :py:class:`TimeoutError`. When :py:attr:`hedger` is set to a
+    :py:class:`playme.hedge.Hedger`, slow calls are duplicated. When
+    :py:attr:`breaker` is set to a :py:class:`playme.breaker.CircuitBreaker`,
+    calls of failing API methods are not made: the stale cached message is
+    returned if there is one, otherwise :py:class:`CircuitOpenError` is
+    raised.
     """
+    pool = ConnectionPool('api.playme.com')
+    cache = None
+    single_flight = SingleFlight()
+    rate_limiter = None
+    metrics = None
+    transport = None
+    timeout = None
+    hedger = None
+    breaker = None
+
     def __init__ (self, api_method, query_string=None, **kwargs):
-        query_string = query_string or dict()
-        if not isinstance(query_string, QueryString):
-            query_string = QueryString(query_string)
+        if kwargs or not isinstance(query_string, FrozenQueryString):
+            query_string = FrozenQueryString(query_string, **kwargs)
         if not isinstance(api_method, Method):
             api_method = Method(api_method)
-        query_string.update(kwargs)
         self.method = api_method
         self.data = query_string
         self._response = None
+        self._body = self._headers = self._cached = None
+        self._path = self._url = self._hash = None
 
     @property
     def response(self):
         """The :py:class:`Response`"""
         if not self._response:
-            try:
-                response = urlopen(str(self))
-            except HTTPError as e:
-                response = e
-            self._response = Response(response.read())
+            if self.single_flight is None:
+                self._response = self._fetch()
+            else:
+                self._response = self.single_flight.do(str(self), self._fetch)
         return self._response
 
+    def _fetch(self):
+        if self.cache is not None:
+            self._cached = self.cache.lookup(self)
+            if self._cached is not None and self._cached.fresh:
+                self._body = self._cached.body
+                return self._cached.response or Response(self._body)
+        try:
+            if self.breaker is None:
+                response = self._limited()
+            else:
+                response = self.breaker.call(self, self._limited)
+        except CircuitOpenError:
+            if self._cached is None or not self.breaker.stale:
+                raise
+            self._body = self._cached.body
+            return self._cached.response or Response(self._body)
+        if self._cached is not None and self._body is self._cached.body:
+            self.cache.revalidated(self, self._cached)
+        elif self.cache is not None and response.status:
+            self.cache.set(self, self._body, self._headers, response)
+        return response
+
+    def _limited(self):
+        if self.rate_limiter is None:
+            return self._call()
+        return self.rate_limiter.call(self, self._call)
+
+    def _call(self):
+        if self.metrics is None:
+            return self._urlopen()
+        return self.metrics.call(self, self._urlopen)
+
+    def _urlopen(self):
+        if self.hedger is None:
+            self._headers, self._body, response = self._open()
+        else:
+            self._headers, self._body, response = self.hedger.call(
+                self, self._open)
+        return response
+
+    def _open(self):
+        """Performs a single call, and returns the response headers, message
+        and :py:class:`Response`."""
+        headers = None if self._cached is None else self._cached.validators
+        timeout = self.call_timeout()
+        try:
+            if self.transport is None:
+                status, received, body = self.pool.urlopen(self.path, headers,
+                                                           timeout)
+            else:
+                status, received, body = self.transport.urlopen(self, headers,
+                                                                timeout)
+        except socket.timeout:
+            if timeout is None:
+                # The timeout of the pool or transport expired.
+                raise TimeoutError('%s timed out' % self.method)
+            raise TimeoutError('%s timed out after %.3f seconds' % (
+                self.method, timeout))
+        if status == NOT_MODIFIED and self._cached is not None:
+            body = self._cached.body
+            return received, body, self._cached.response or Response(body)
+        return received, body, Response(body)
+
+    def call_timeout(self):
+        """The seconds a call can wait for the API: the smaller of
+        :py:attr:`timeout` and the time left before the :py:func:`deadline`,
+        or None if neither is set. Raises :py:class:`DeadlineError` if the
+        deadline has passed.
+
+        >>> request = Request('artist.get', artistCode=1)
+        >>> request.call_timeout() is None
+        True
+        >>> with deadline(-1):
+        ...     request.call_timeout()
+        Traceback (most recent call last):
+            ...
+        DeadlineError: Deadline exceeded before calling artist.get
+        """
+        left = time_left()
+        if left is None:
+            return self.timeout
+        if left <= 0:
+            raise DeadlineError('Deadline exceeded before calling %s' %
+                                self.method)
+        return left if self.timeout is None else min(left, self.timeout)
+
+    def stream(self):
+        """Performs the request and returns an iterable of the response
+        message chunks, as they are received."""
+        timeout = self.call_timeout()
+        if self.transport is None:
+            return self.pool.stream(self.path, timeout=timeout)
+        return self.transport.stream(self, timeout=timeout)
+
+    @property
+    def body(self):
+        """The raw response message, once received from the API."""
+        return self._body
+
+    @property
+    def headers(self):
+        """The response headers, once received from the API, as a
+        :py:class:`dict` with lower case names."""
+        return self._headers
+
+    @property
+    def path(self):
+        """The path and query string part of the request URL. It's computed
+        once, together with the URL and the hash, so :py:attr:`data` should
+        not be changed afterwards."""
+        if self._path is None:
+            self._path = '/%s?%s' % (self.method, self.data)
+        return self._path
+
     def __repr__(self):
         return 'Request(%r, %r)' % (self.method, self.data)
 
     def __str__(self):
-        return 'http://api.playme.com/%s?%s' % (self.method, self.data)
+        if self._url is None:
+            self._url = self.pool.url(self.path)
+        return self._url
 
     def __hash__(self):
-        return hash(str(self))
+        if self._hash is None:
+            self._hash = hash(str(self))
+        return self._hash
 
     def __cmp__(self, other):
         return cmp(hash(self), hash(other))
@@ -355,8 +766,9 @@ class Method(str):
     """Utility class to build API methods name and call them as functions.
 
     :py:class:`Method` has custom attribute access to build method names like
-    those specified in the API. Each attribute access builds a new Method with
-    a new name.
+    those specified in the API. Each attribute access returns a Method with
+    a new name, built the first time and then reused, for the first
+    :py:data:`MAX_METHODS` names built.
 
     Calling a :py:class:`Method` as a function with positional arguments,
     builds a :py:class:`Request`, runs it and returns the result.
@@ -367,16 +779,30 @@ class Method(str):
     >>> album = playme.core.Method('album')
     >>> album.getTracks
     Method('album.getTracks')
+    >>> album.getTracks is album.getTracks
+    True
     """
     def __getattribute__(self, name):
         if name.startswith('_'):
             return super(Method, self).__getattribute__(name)
-        else:
-            return Method('.'.join([self, name]))
+        try:
+            return _methods[self, name]
+        except KeyError:
+            if len(_methods) >= MAX_METHODS:
+                return Method('.'.join([self, name]))
+            method = Method(intern('.'.join([self, name])))
+            _methods[self, name] = method
+            return method
 
     def __call__ (self, **query):
         query['format'] = 'json'
         return Request(self, query).response
 
     def __repr__(self):
-        return "Method('%s')" % self
\ No newline at end of file
+        return "Method('%s')" % self
+
+
+_methods = dict()
+MAX_METHODS = 1024
+"""The number of :py:class:`Method` names cached, so that probing arbitrary
+attributes doesn't grow the cache forever."""
@@ -0,0 +1,239 @@
+"""This module mirrors parts of the playMe catalogue, walking it breadth-first
+from a set of artists down to their albums and tracks, and exporting every
+item to a sink as soon as it's fetched::
+
+    from playme.crawler import Crawler, NDJSONSink
+    with NDJSONSink('catalog.ndjson') as sink:
+        crawler = Crawler(sink, checkpoint='catalog.json', country='us')
+        crawler.crawl([1073, 421])
+
+Every exported record is a :py:class:`dict` with the item *kind*
+(``'artist'``, ``'album'`` or ``'track'``), its *code*, the *parent* code
+(the artist of an album, the album of a track) and the *item* itself.
+
+Artists and albums are visited once, and only their codes are remembered, so
+the graph is never held in memory. When a **checkpoint** file is given, the
+visited codes and the frontier are saved there periodically: a crawl started
+again with the same checkpoint resumes where the previous one stopped. Items
+exported after the last checkpoint are exported again, so
+:py:class:`SqliteSink` replaces them, while :py:class:`NDJSONSink` appends
+them.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import json
+import os
+import sqlite3
+import tempfile
+from collections import deque
+from Queue import Queue
+
+from playme import core, concurrent
+from playme.api import artist, album
+from playme.item import Artist, Albums, Tracks
+
+ARTIST, ALBUM, TRACK = 'artist', 'album', 'track'
+
+
+def record(kind, item, parent=None):
+    """The exported record of **item**, found under the **parent** code.
+
+    >>> from playme.crawler import record
+    >>> from playme.item import Track
+    >>> r = record('track', Track(trackCode=1, name='One'), parent=7)
+    >>> r['kind'], r['code'], r['parent'], r['item']['name']
+    ('track', 1, 7, 'One')
+    """
+    return {'kind': kind, 'code': item[item.code_key], 'parent': parent,
+            'item': dict(item.items())}
+
+
+class NDJSONSink(object):
+    """Appends the records to the file at **path**, one json document per
+    line."""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SqliteSink(object):
+    """Stores the records in the *items* table of the sqlite database at
+    **path**, replacing the ones already there.
+
+    >>> from playme.crawler import SqliteSink
+    >>> from playme.item import Track
+    >>> sink = SqliteSink(':memory:')
+    >>> for i in range(2):
+    ...     sink.write(record('track', Track(trackCode=1, name='One'), 7))
+    >>> sink.flush()
+    >>> sink.db.execute('SELECT kind, code, parent FROM items').fetchall()
+    [(u'track', u'1', u'7')]
+    """
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS items (kind TEXT, '
+                        'code TEXT, parent TEXT, item TEXT, '
+                        'PRIMARY KEY (kind, code, parent))')
+
+    def write(self, record):
+        parent = record['parent']
+        self.db.execute('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)', (
+            record['kind'], unicode(record['code']),
+            u'' if parent is None else unicode(parent),
+            json.dumps(record['item'])))
+
+    def flush(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Crawler(object):
+    """Crawls the catalogue, writing the records to **sink**. At most
+    **workers** artists or albums are fetched concurrently, and the
+    collections are requested **page_size** items at a time. **query** is
+    added to every API call, e.g. the *country*.
+
+    Artists credited on the albums and tracks found are visited in turn, up
+    to **depth** hops away from the initial ones: by default only the
+    initial artists are. Progress is saved to the **checkpoint** file every
+    **checkpoint_every** visits, if given. Artists and albums whose requests
+    fail are counted in the *errors* stat, and retried when resuming.
+    """
+    def __init__(self, sink, checkpoint=None, workers=8, depth=0,
+                 page_size=50, checkpoint_every=100, **query):
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.depth = depth
+        self.page_size = page_size
+        self.checkpoint_every = checkpoint_every
+        self.query = query
+        self.visited = set()
+        self.pending = deque()
+        self.failed = list()
+        self.stats = {ARTIST: 0, ALBUM: 0, TRACK: 0, 'errors': 0}
+
+    def crawl(self, artists=()):
+        """Crawls the catalogue from the **artists** codes, or from the
+        checkpoint if there is one, and returns :py:attr:`stats`."""
+        if not self.load():
+            for code in artists:
+                self._visit(ARTIST, code, 0)
+        executor = concurrent.Executor(self.workers)
+        completed = Queue()
+        running = dict()
+        visits = 0
+        try:
+            while self.pending or running:
+                while self.pending and len(running) < self.workers:
+                    node = self.pending.popleft()
+                    running[node] = future = executor.submit(self._fetch, *node)
+                    future.add_done_callback(
+                        lambda f, node=node: completed.put(node))
+                node = completed.get()
+                self._export(node, running.pop(node))
+                visits += 1
+                if self.checkpoint and visits % self.checkpoint_every == 0:
+                    self.save(running)
+        finally:
+            executor.shutdown(wait=False)
+            self.sink.flush()
+            if self.checkpoint:
+                self.save(running)
+        return self.stats
+
+    def _visit(self, kind, code, level):
+        if (kind, code) not in self.visited:
+            self.visited.add((kind, code))
+            self.pending.append((kind, code, level))
+
+    def _fetch(self, kind, code, level):
+        """Runs on a worker thread: returns the records of a node and of
+        its children."""
+        if kind == ARTIST:
+            item = Artist.request(artistCode=code, **self.query)
+            records = [record(ARTIST, item)]
+            children = Albums.iter_request(artist.getAlbums, self.page_size,
+                                           artistCode=code, **self.query)
+            child_kind = ALBUM
+        else:
+            records = list()
+            children = Tracks.iter_request(album.getTracks, self.page_size,
+                                           albumCode=code, **self.query)
+            child_kind = TRACK
+        for child in children:
+            records.append(record(child_kind, child, code))
+        return records
+
+    def _export(self, node, future):
+        kind, code, level = node
+        try:
+            records = future.result()
+        except core.CALL_ERRORS:
+            self.stats['errors'] += 1
+            self.failed.append(node)
+            return
+        for r in records:
+            self.sink.write(r)
+            self.stats[r['kind']] += 1
+            if r['kind'] == ALBUM:
+                self._visit(ALBUM, r['code'], level)
+            if level < self.depth and r['kind'] != ARTIST:
+                artist_code = r['item'].get('artistCode')
+                if artist_code is not None:
+                    self._visit(ARTIST, artist_code, level + 1)
+
+    def save(self, running=()):
+        """Flushes the sink, and saves the progress to the checkpoint file.
+        The nodes **running** and the failed ones are saved as pending."""
+        self.sink.flush()
+        state = {
+            'visited': list(self.visited),
+            'pending': list(running) + self.failed + list(self.pending),
+            'stats': self.stats,
+        }
+        directory = os.path.dirname(os.path.abspath(self.checkpoint))
+        fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as checkpoint:
+            json.dump(state, checkpoint)
+        os.rename(temp, self.checkpoint)
+
+    def load(self):
+        """Restores the progress saved in the checkpoint file, if any, and
+        returns True if it did."""
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return False
+        with open(self.checkpoint, 'rb') as checkpoint:
+            state = json.load(checkpoint)
+        self.visited = set(tuple(node) for node in state['visited'])
+        self.pending = deque(tuple(node) for node in state['pending'])
+        self.stats.update(state['stats'])
+        self.failed = list()
+        return True
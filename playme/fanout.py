@@ -0,0 +1,99 @@
+"""This module runs the same query against several country catalogues at
+once, and merges the results::
+
+    from playme import fanout
+    from playme.api import artist
+    from playme.item import Artist, Artists
+
+    artists = fanout.request(Artists, ('us', 'it', 'de'),
+                             artist.searchByName, query='pink')
+    artists.availability[artists[0]['artistCode']]  # ['us', 'it']
+    fanout.request(Artist, ('us', 'it', 'de'), artistCode=1073)
+
+The calls run on :py:data:`executor`, whose workers bound the number of
+concurrent fan-out calls across the whole process. They are plain API calls,
+so they go through :py:attr:`playme.core.Request.cache` like any other:
+countries already fetched are served from there.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+from collections import OrderedDict
+
+from playme import core, concurrent
+from playme.item import ItemsCollection, LABEL2CLS
+
+executor = concurrent.Executor(workers=8)
+"""The :py:class:`playme.concurrent.Executor` running the fan-out calls."""
+
+
+def request(cls, countries, method=None, **kwargs):
+    """Requests **cls**, either an :py:class:`playme.item.Item` or an
+    :py:class:`playme.item.ItemsCollection` subclass, in every country of
+    **countries**. A collection is requested calling the API **method**,
+    an item by its :py:attr:`playme.item.Item.api_method`; **kwargs** is the
+    rest of the query string.
+
+    Returns a single collection, e.g. :py:class:`playme.item.Artists` for
+    both :py:class:`playme.item.Artist` and :py:class:`playme.item.Artists`,
+    holding every item found once, in the order of the countries. The
+    collection *availability* attribute maps the code of every item to the
+    list of countries where it was found, while the *errors* attribute maps
+    countries to the :py:class:`playme.core.Error` (or network error) their
+    call raised, e.g. because the item isn't available there.
+
+    >>> from playme import fanout
+    >>> from playme.item import Artists
+    >>> fanout.request(Artists, ('us', 'it'))
+    Traceback (most recent call last):
+        ...
+    TypeError: Artists needs an API method
+    """
+    if issubclass(cls, ItemsCollection):
+        if method is None:
+            raise TypeError(cls.__name__ + ' needs an API method')
+        collection = cls
+        call = lambda country: cls.request(method, country=country, **kwargs)
+    else:
+        collection = LABEL2CLS[cls.label + 's']
+        call = lambda country: collection(cls.request(country=country,
+                                                      **kwargs))
+    futures = [(country, executor.submit(call, country))
+               for country in OrderedDict.fromkeys(countries)]
+    return merge(collection, futures)
+
+
+def merge(collection, futures):
+    """Merges the collections computed by **futures**, a sequence of
+    ``(country, future)`` pairs, into a single **collection**. See
+    :py:func:`request`.
+
+    >>> from playme.concurrent import Future
+    >>> from playme.item import Track, Tracks
+    >>> from playme import fanout
+    >>> us, it = Future(), Future()
+    >>> us.set_result(Tracks(Track(trackCode=1), Track(trackCode=2)))
+    >>> it.set_result(Tracks(Track(trackCode=2, country='it')))
+    >>> tracks = fanout.merge(Tracks, [('us', us), ('it', it)])
+    >>> tracks
+    Tracks(Track(trackCode = 1), Track(trackCode = 2))
+    >>> tracks.availability
+    {1: ['us'], 2: ['us', 'it']}
+    """
+    items, availability, errors = list(), dict(), dict()
+    for country, future in futures:
+        try:
+            found = future.result()
+        except core.CALL_ERRORS as e:
+            errors[country] = e
+            continue
+        for item in found:
+            code = item.get(item.code_key, item)
+            if code not in availability:
+                availability[code] = list()
+                items.append(item)
+            availability[code].append(country)
+    merged = collection(*items)
+    merged.availability = availability
+    merged.errors = errors
+    return merged
@@ -0,0 +1,193 @@
+"""This module cuts the latency tail of the API calls with hedged requests:
+when a call is slower than most of the recent ones, a duplicate is sent, and
+the first answer wins. It's enabled by assigning a :py:class:`Hedger` to
+:py:attr:`playme.core.Request.hedger`::
+
+    import playme.core, playme.hedge
+    playme.core.Request.hedger = playme.hedge.Hedger(quantile=0.95)
+
+Only the calls slower than the **quantile** of their API method latencies
+are duplicated, and never more than a **budget** fraction of all the calls,
+so that the load on the API grows by a few percent at most.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import sys
+import threading
+import time
+from collections import deque
+from Queue import Empty, Queue
+
+from playme import core, concurrent
+
+
+class Hedger(object):
+    """Hedges the calls slower than the **quantile** of the last **window**
+    latencies of their API method, once at least **min_samples** of them
+    have been measured, and at most a **budget** fraction of the calls.
+    :py:attr:`hedged` counts the duplicates sent, :py:attr:`won` those which
+    answered first.
+
+    While a call may be hedged, it runs on :py:attr:`executor`, which
+    starts a thread whenever none is idle, and the caller waits for the
+    first answer; otherwise it runs on the caller's thread. The hedging
+    timers of an API method share a single thread.
+
+    >>> import time
+    >>> from playme.core import Request
+    >>> from playme.hedge import Hedger
+    >>> hedger = Hedger(min_samples=3, min_delay=0)
+    >>> request = Request('artist.get', artistCode=1)
+    >>> for latency in (0.01, 0.01, 0.01):
+    ...     hedger.record('artist.get', latency)
+    >>> hedger.delay('artist.get')
+    0.01
+    >>> latencies = [0.5, 0]
+    >>> hedger.call(request, lambda: time.sleep(latencies.pop(0)) or 'answer')
+    'answer'
+    >>> hedger.hedged, hedger.won
+    (1, 1)
+    >>> hedger.executor.shutdown()
+    """
+    def __init__(self, quantile=0.95, window=200, min_samples=20,
+                 min_delay=0.005, budget=0.05):
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget = budget
+        self.executor = concurrent.Executor(workers=None)
+        self.calls = 0
+        self.hedged = 0
+        self.won = 0
+        self._latencies = dict()
+        self._delays = dict()
+        self._timers = dict()
+        self._lock = threading.Lock()
+
+    def record(self, method, elapsed):
+        """Accounts a call of **method** that lasted **elapsed** seconds."""
+        with self._lock:
+            try:
+                latencies = self._latencies[method]
+            except KeyError:
+                latencies = self._latencies[method] = deque(
+                    maxlen=self.window)
+            latencies.append(elapsed)
+            # Sorting the window at every call would cost more than it saves.
+            count = len(latencies)
+            if count >= self.min_samples and (
+                    method not in self._delays or count % 16 == 0):
+                ordered = sorted(latencies)
+                delay = ordered[min(count - 1, int(count * self.quantile))]
+                self._delays[method] = max(delay, self.min_delay)
+
+    def delay(self, method):
+        """The seconds after which a call of **method** is hedged, or None
+        if not enough calls have been measured yet."""
+        return self._delays.get(method)
+
+    def _allow(self):
+        with self._lock:
+            if self.hedged < self.budget * self.calls:
+                self.hedged += 1
+                return True
+            return False
+
+    def _schedule(self, method, at, func):
+        """Calls ``func()`` at the time **at**."""
+        with self._lock:
+            try:
+                timers = self._timers[method]
+            except KeyError:
+                timers = self._timers[method] = Queue()
+                thread = threading.Thread(target=self._fire, args=(timers,))
+                thread.daemon = True
+                thread.start()
+        timers.put((at, func))
+
+    @staticmethod
+    def _fire(timers):
+        # The delay of a method changes slowly, so its timers are due about
+        # in the order they're set: one thread sleeping until the next one
+        # is due serves them all. Sleeping, rather than waiting with a
+        # timeout, fires on time: timed waits poll on python 2.
+        while True:
+            at, func = timers.get()
+            time.sleep(max(0, at - time.time()))
+            func()
+
+    def call(self, request, func):
+        """Returns ``func()``, which performs **request**, hedging it if
+        it's slow."""
+        method = str(request.method)
+        delay = self.delay(method)
+        with self._lock:
+            self.calls += 1
+            exhausted = self.hedged >= self.budget * self.calls
+        if delay is None or exhausted:
+            start = time.time()
+            result = func()
+            self.record(method, time.time() - start)
+            return result
+        answers = Queue()
+        lock = threading.Lock()
+        # The hedge is sent by a timer thread: it must carry the deadline.
+        deadline = core.current_deadline()
+        # The attempts running, or None once the call has been answered.
+        running = [1]
+
+        def attempt(hedged):
+            start = time.time()
+            try:
+                result = func()
+            except:
+                answers.put((hedged, None, sys.exc_info()))
+            else:
+                self.record(method, time.time() - start)
+                answers.put((hedged, result, None))
+
+        def hedge():
+            with lock:
+                if running[0] is None or not self._allow():
+                    return
+                running[0] += 1
+            with core.deadline(at=deadline):
+                self.executor.submit(attempt, True)
+
+        self.executor.submit(attempt, False)
+        self._schedule(method, time.time() + delay, hedge)
+        exc_info = None
+        while True:
+            try:
+                if deadline is None:
+                    hedged, result, error = answers.get()
+                else:
+                    hedged, result, error = answers.get(
+                        timeout=max(0, deadline - time.time()))
+            except Empty:
+                with lock:
+                    running[0] = None
+                raise core.TimeoutError('Deadline exceeded waiting for %s' %
+                                        method)
+            with lock:
+                running[0] -= 1
+                if error is None or not running[0]:
+                    running[0] = None
+            if error is None:
+                if hedged:
+                    with self._lock:
+                        self.won += 1
+                return result
+            exc_info = exc_info or error
+            if running[0] is None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+    @property
+    def stats(self):
+        """A :py:class:`dict` with *calls*, *hedged* and *won* counters, and
+        the current hedging *delays* by API method."""
+        with self._lock:
+            return {'calls': self.calls, 'hedged': self.hedged,
+                    'won': self.won, 'delays': dict(self._delays)}
@@ -0,0 +1,248 @@
+"""This module provides a local, in-memory search index of artists, albums and
+tracks, answering name lookups without calling the API search engine::
+
+    from playme.index import SearchIndex
+    index = SearchIndex.load('catalog.ndjson')
+    index.searchByName(query='pink flo')
+
+Names are normalized (lower case, without accents and punctuation) and split
+into tokens: a query matches the names holding a token starting with each of
+its tokens, so that partial words typed in an autocomplete field match too.
+Results are returned as the same :py:class:`playme.item.ItemsCollection`
+returned by the API, e.g. :py:class:`playme.item.Artists`.
+
+The index can be filled from items, e.g. the results of API calls, or from a
+:py:mod:`playme.crawler` NDJSON export, and updated as new items arrive.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import heapq
+import json
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from playme.item import ENTITIES, LABEL2CLS, Artist
+
+_separators = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(name):
+    """Returns the tokens of **name**, lower case and without accents.
+
+    >>> from playme.index import normalize
+    >>> normalize(u'Beyonc\\xe9 & The Jay-Z')
+    [u'beyonce', u'the', u'jay', u'z']
+    """
+    if isinstance(name, str):
+        name = name.decode('utf-8', 'replace')
+    name = unicodedata.normalize('NFKD', name)
+    name = u''.join(c for c in name if not unicodedata.combining(c))
+    return [token for token in _separators.split(name.lower()) if token]
+
+
+class SearchIndex(object):
+    """A thread-safe name index of :py:class:`playme.item.Artist`,
+    :py:class:`playme.item.Album` and :py:class:`playme.item.Track` items.
+    Albums and tracks also index their artist, if it isn't known yet.
+
+    >>> from playme.index import SearchIndex
+    >>> from playme.item import Artist, Track
+    >>> index = SearchIndex([Artist(artistCode=1, name='Pink Floyd'),
+    ...                      Artist(artistCode=2, name='Pink'),
+    ...                      Track(trackCode=3, name='Money', artistCode=1)])
+    >>> index.searchByName(query='pink')
+    Artists(Artist(artistCode = 2, name = 'Pink'), Artist(artistCode = 1, name = 'Pink Floyd'))
+    >>> index.searchByName(query='FLO')
+    Artists(Artist(artistCode = 1, name = 'Pink Floyd'))
+    >>> index.add(Artist(artistCode=4, name=u'Pink\\xe9 Martini'))
+    >>> len(index.searchByName(query='pinke'))
+    1
+    >>> [track['name'] for track in index.search('mon', label='track')]
+    ['Money']
+    >>> index.update([Artist(artistCode=2, name='Pink!'),
+    ...               Artist(artistCode=1, name='Floyd'),
+    ...               Artist(artistCode=1, name='Pink Floyd')])
+    >>> index.searchByName(query='pink')
+    Artists(Artist(artistCode = 2, name = 'Pink!'), Artist(artistCode = 1, name = 'Pink Floyd'), Artist(artistCode = 4, name = u'Pink\\xe9 Martini'))
+    """
+    def __init__(self, items=()):
+        self._items = dict()
+        self._names = dict()
+        self._sorted = dict()
+        self._postings = dict()
+        self._tokens = dict()
+        self._unsorted = set()
+        self._lock = threading.RLock()
+        for cls in ENTITIES:
+            if hasattr(cls, 'code_key'):
+                self._items[cls.label] = dict()
+                self._names[cls.label] = dict()
+                self._sorted[cls.label] = list()
+                self._postings[cls.label] = dict()
+                self._tokens[cls.label] = list()
+        self.update(items)
+
+    def __len__(self):
+        return sum(len(items) for items in self._items.values())
+
+    def add(self, item):
+        """Indexes **item**, replacing the one with the same code."""
+        with self._lock:
+            self._add(item.label, item[item.code_key], item)
+            if not isinstance(item, Artist) and 'artistName' in item:
+                code = item.get('artistCode')
+                if code is not None and code not in self._items[Artist.label]:
+                    self._add(Artist.label, code, Artist(
+                        artistCode=code, name=item['artistName']))
+
+    def update(self, items):
+        """Indexes every item in **items**."""
+        with self._lock:
+            for item in items:
+                self.add(item)
+
+    def _add(self, label, code, item):
+        items = self._items[label]
+        tokens = normalize(item.get('name', u''))
+        name = u' '.join(tokens)
+        if code in items:
+            if self._names[label][code] == name:
+                items[code] = item
+                return
+            self._discard(label, code)
+        items[code] = item
+        self._names[label][code] = name
+        self._sorted[label].append((name, code))
+        postings = self._postings[label]
+        for token in set(tokens):
+            try:
+                postings[token].add(code)
+            except KeyError:
+                postings[token] = set((code,))
+                self._tokens[label].append(token)
+        # Sorting once before the next lookup is much cheaper than keeping
+        # the lists sorted while a large number of items is being added.
+        self._unsorted.add(label)
+
+    def _sort(self, label):
+        names, tokens = self._sorted[label], self._tokens[label]
+        if len(names) > 2 * len(self._names[label]) + 16:
+            # Too many discarded names: drop them, with unused tokens.
+            names[:] = [(name, code)
+                        for code, name in self._names[label].iteritems()]
+            postings = self._postings[label]
+            for token in tokens:
+                if not postings[token]:
+                    del postings[token]
+            tokens[:] = postings.keys()
+            self._unsorted.add(label)
+        if label in self._unsorted:
+            names.sort()
+            tokens.sort()
+            self._unsorted.discard(label)
+
+    def discard(self, item):
+        """Removes **item** from the index, if it's there."""
+        with self._lock:
+            if item[item.code_key] in self._items[item.label]:
+                self._discard(item.label, item[item.code_key])
+
+    def _discard(self, label, code):
+        # The name and its tokens stay in the sorted lists, where they are
+        # skipped, until _sort drops them all at once.
+        del self._items[label][code]
+        name = self._names[label].pop(code)
+        postings = self._postings[label]
+        for token in set(name.split()):
+            postings[token].discard(code)
+
+    def _range(self, label, prefix):
+        """The range of the tokens starting with **prefix**."""
+        tokens = self._tokens[label]
+        return (bisect_left(tokens, prefix),
+                bisect_left(tokens, prefix + u'\uffff'))
+
+    def _prefixed(self, label, start, stop):
+        """The codes of the items holding a token in the range. The result
+        must not be modified, it may be part of the index."""
+        postings, tokens = self._postings[label], self._tokens[label]
+        if stop - start == 1:
+            return postings[tokens[start]]
+        codes = set()
+        for i in xrange(start, stop):
+            codes.update(postings[tokens[i]])
+        return codes
+
+    def search(self, query, label=Artist.label, limit=None):
+        """Returns the **label** items matching **query**, at most **limit**
+        if given, as an :py:class:`playme.item.ItemsCollection`. Names
+        starting with the query come first, then the others, both in
+        alphabetical order."""
+        terms = normalize(query)
+        collection = LABEL2CLS[label + 's']
+        if not terms:
+            return collection()
+        with self._lock:
+            self._sort(label)
+            items, names = self._items[label], self._sorted[label]
+            prefix = u' '.join(terms)
+            found = list()
+            current = self._names[label]
+            for i in xrange(bisect_left(names, (prefix,)), len(names)):
+                if (not names[i][0].startswith(prefix) or
+                        limit is not None and len(found) >= limit):
+                    break
+                name, code = names[i]
+                # Skips discarded names, and the copy of a name given back
+                # to an item, sorted next to each other.
+                if current.get(code) == name and code not in found[-1:]:
+                    found.append(code)
+            if limit is None or len(found) < limit:
+                names = current
+                ranges = sorted((self._range(label, term), term)
+                                for term in set(terms))
+                ranges.sort(key=lambda r: r[0][1] - r[0][0])
+                codes = None
+                for (start, stop), term in ranges:
+                    if codes is None:
+                        codes = self._prefixed(label, start, stop)
+                    elif len(codes) < stop - start:
+                        # Checking the names of a few candidates is cheaper
+                        # than collecting the items of many tokens.
+                        codes = set(code for code in codes if any(
+                            token.startswith(term)
+                            for token in names[code].split()))
+                    else:
+                        codes = codes & self._prefixed(label, start, stop)
+                    if not codes:
+                        break
+                codes = codes.difference(found)
+                others = ((names[code], code) for code in codes)
+                if limit is None:
+                    others = sorted(others)
+                else:
+                    others = heapq.nsmallest(limit - len(found), others)
+                found.extend(code for name, code in others)
+            return collection(*[items[code] for code in found])
+
+    def searchByName(self, **kwargs):
+        """The local counterpart of :py:meth:`playme.item.Artists.searchByName`:
+        returns the :py:class:`playme.item.Artists` matching the *query*
+        argument. Paging and API arguments are ignored."""
+        return self.search(kwargs['query'], Artist.label)
+
+    @classmethod
+    def load(cls, path):
+        """Builds an index out of the NDJSON file at **path**, as exported by
+        :py:class:`playme.crawler.NDJSONSink`."""
+        index = cls()
+        with open(path, 'rb') as dump:
+            for line in dump:
+                record = json.loads(line)
+                item_type = LABEL2CLS[record['kind']]
+                index.add(item_type(**dict(
+                    (str(k), v) for k, v in record['item'].items())))
+        return index
@@ -7,9 +7,14 @@
 import playme
 __license__, __author__ = playme.__license__, playme.__author__
 
-from playme import core
+from itertools import repeat
+
+from playme import core, concurrent, stream
 from playme.api import artist, album, track
 
+NOT_FOUND = 13000
+
+
 def str_keys(d):
     if not isinstance(d, dict):
         d = dict(d)
@@ -27,6 +32,7 @@ class Item(dict):
     """
     api_method = None
     label = None
+    code_key = None
 
     def __init__(self, **kwargs):
         if self.label in kwargs:
@@ -46,25 +52,106 @@ class Item(dict):
             ', '.join(['%s = %r' % (k, v) for k, v in self.iteritems()])
         )
 
+    def compact(self):
+        """ Returns the :py:class:`CompactItem` version of this item.
+        >>> Track(trackCode=1, name='One').compact()
+        CompactTrack(trackCode = 1, name = 'One')
+        """
+        return self.compact_type.fromItem(self)
+
     def __hash__(self):
-        return hash(repr(self))
+        """ Items are identified by their API code, if any; otherwise by
+        their content, regardless of the keys order.
+        >>> hash(Track(trackCode=1, name='One')) == hash(Track(trackCode=1))
+        True
+        >>> hash(Item(a=1, b=2)) == hash(Item(b=2, a=1))
+        True
+        """
+        try:
+            return hash(self[self.code_key])
+        except KeyError:
+            pass
+        try:
+            return hash(frozenset(self.iteritems()))
+        except TypeError:
+            return hash(frozenset(self))
 
     @classmethod
-    def request(cls, **kwargs):
-        """
+    def request(cls, deadline=None, **kwargs):
+        """ Returns an item after an API call, that must complete within
+        **deadline** seconds if given, see :py:func:`playme.core.deadline`.
         >>> Item.request(a=1, b=2)
         Traceback (most recent call last):
             ...
         NotImplementedError: Item.api_method
         """
-        try:
-            response = cls.api_method(**kwargs)
-        except TypeError:
-            raise NotImplementedError(cls.__name__ + '.api_method')
+        with core.deadline(deadline):
+            try:
+                response = cls.api_method(**kwargs)
+            except TypeError:
+                raise NotImplementedError(cls.__name__ + '.api_method')
+            return cls.fromResponseMessage(response)
+
+    @classmethod
+    def request_many(cls, codes, **kwargs):
+        """ Requests an item for each code in **codes**, using **kwargs** as
+        common query string, e.g.::
+
+            tracks = Track.request_many([1, 2, 1], country='us')
+
+        Identical requests are performed once, and all of them run
+        concurrently on :py:data:`playme.concurrent.executor`. Returns a
+        :py:class:`list` in the same order of **codes**: each element is
+        either the item, or the :py:class:`playme.core.Error` (or network
+        error) raised while requesting it.
+
+        >>> Item.request_many([1, 2])
+        Traceback (most recent call last):
+            ...
+        NotImplementedError: Item.code_key
+        """
+        if cls.api_method is None or cls.code_key is None:
+            raise NotImplementedError(cls.__name__ + '.code_key')
+        kwargs['format'] = 'json'
+        requests = [core.Request(cls.api_method, kwargs, **{cls.code_key: c})
+                    for c in codes]
+        futures = dict()
+        for request in requests:
+            if request not in futures:
+                futures[request] = concurrent.executor.submit(
+                    cls._fromRequest, request)
+        results = list()
+        for request in requests:
+            try:
+                results.append(futures[request].result())
+            except core.CALL_ERRORS as e:
+                results.append(e)
+        return results
+
+    @classmethod
+    def _fromRequest(cls, request):
+        return cls.fromResponseMessage(request.response)
+
+    @classmethod
+    def fromResponseMessage(cls, response):
+        """ Returns an item, built on a :py:class:`playme.core.Response`
+        """
         if not response.status:
             raise core.Error(str(response.status))
         return cls(**str_keys(response))
 
+    @classmethod
+    def request_async(cls, **kwargs):
+        """The non blocking version of :py:meth:`request`: returns a
+        :py:class:`playme.concurrent.Future` of the item.
+
+        >>> Item.request_async(a=1, b=2).result(timeout=1)
+        Traceback (most recent call last):
+            ...
+        NotImplementedError: Item.api_method
+        """
+        return concurrent.executor.submit(cls.request, **kwargs)
+
 
 class ItemsCollection(tuple):
     """ This is the base class for collections of items, like search results, or
@@ -75,22 +162,50 @@ class ItemsCollection(tuple):
     """
     item_type = Item
     label = None
+    page_key = 'page'
+    page_size_key = 'pageSize'
 
     def __new__(cls, *args):
         casted = list()
+        seen = set()
         for item in args:
-            if not isinstance(item, cls.item_type):
-                try:
-                    item = cls.item_type(**str_keys(item))
-                except (ValueError, TypeError, AttributeError) as e:
-                    item = None
-            if item and item not in casted:
+            item = cls._cast(item)
+            if item and item not in seen:
+                seen.add(item)
                 casted.append(item)
         return tuple.__new__(cls, casted)
 
+    @classmethod
+    def _cast(cls, item):
+        if isinstance(item, cls.item_type):
+            return item
+        try:
+            fields = item[cls.item_type.label]
+            if len(item) == 1 and isinstance(fields, dict):
+                # The shape of the items in the response messages: building
+                # them directly spares the keyword arguments copies.
+                cast = dict.__new__(cls.item_type)
+                dict.update(cast, [(str(k), v) for k, v in fields.iteritems()])
+                return cast
+        except (KeyError, IndexError, TypeError, ValueError):
+            pass
+        try:
+            item = cls.item_type(**str_keys(item))
+        except (ValueError, TypeError, AttributeError) as e:
+            item = None
+        return item
+
     def __repr__(self):
         return '%s(%s)' % (type(self).__name__, ', '.join(repr(i) for i in self))
 
+    def __reduce__(self):
+        """ Collections are pickled as the arguments of the constructor.
+        >>> import pickle
+        >>> pickle.loads(pickle.dumps(Tracks({'trackCode': 1}), 2))
+        Tracks(Track(trackCode = 1))
+        """
+        return (type(self), tuple(self))
+
     def __getslice__(self, i=0, j=-1):
         """ Return a Collection's slice
         >>> ic = ItemsCollection({'a':1,'b':2}, {'a':3,'b':4})
@@ -115,10 +230,62 @@ class ItemsCollection(tuple):
             raise TypeError, type(index)
 
     @classmethod
-    def request(cls, method, **kwargs):
-        """ Returns an object instance after an API call
+    def request(cls, method, deadline=None, **kwargs):
+        """ Returns an object instance after an API call, that must complete
+        within **deadline** seconds if given, see
+        :py:func:`playme.core.deadline`.
+        """
+        with core.deadline(deadline):
+            return cls.fromResponseMessage(method(**kwargs))
+
+    @classmethod
+    def request_async(cls, method, **kwargs):
+        """ The non blocking version of :py:meth:`request`: returns a
+        :py:class:`playme.concurrent.Future` of the object instance
+        """
+        return concurrent.executor.submit(cls.request, method, **kwargs)
+
+    @classmethod
+    def iter_request(cls, method, page_size=50, limit=None, **kwargs):
+        """ Returns a generator walking all the result pages of an API call,
+        at most **limit** items in total if given. While the items of a page
+        are being consumed, the next page is fetched in background on
+        :py:data:`playme.concurrent.executor`. Pages are selected through the
+        :py:attr:`page_key` and :py:attr:`page_size_key` query string
+        parameters.
+        """
+        def fetch(number):
+            query = dict(kwargs)
+            query[cls.page_key] = number
+            query[cls.page_size_key] = page_size
+            response = method(**query)
+            if number > 1 and response.status == NOT_FOUND:
+                return cls()
+            return cls.fromResponseMessage(response)
+
+        number, count = 1, 0
+        page = concurrent.executor.submit(fetch, number)
+        while True:
+            items = page.result()
+            more = len(items) >= page_size
+            if more and (limit is None or count + len(items) < limit):
+                number += 1
+                page = concurrent.executor.submit(fetch, number)
+            for item in items:
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield item
+            if not more:
+                return
+
+    @classmethod
+    def stream(cls, method, **kwargs):
+        """ Returns a generator of the items, yielded while the response
+        message of the API call is being received and parsed. See
+        :py:mod:`playme.stream`.
         """
-        return cls.fromResponseMessage(method(**kwargs))
+        return stream.stream(cls, method, **kwargs)
 
     @classmethod
     def fromResponseMessage(cls, response):
@@ -132,6 +299,7 @@ class ItemsCollection(tuple):
 class Artist(Item):
     api_method = artist.get
     label = 'artist'
+    code_key = 'artistCode'
 
 
 class Artists(ItemsCollection):
@@ -142,10 +310,18 @@ class Artists(ItemsCollection):
     def searchByName(cls, **kwargs):
         return cls.request(artist.searchByName, **kwargs)
 
+    @classmethod
+    def iter_search(cls, page_size=50, limit=None, **kwargs):
+        """ Returns a generator of all the :py:meth:`searchByName` results,
+        page after page. See :py:meth:`ItemsCollection.iter_request`.
+        """
+        return cls.iter_request(artist.searchByName, page_size, limit, **kwargs)
+
 
 class Album(Item):
     api_method = album.get
     label = 'album'
+    code_key = 'albumCode'
 
 
 class Albums(ItemsCollection):
@@ -156,6 +332,7 @@ class Albums(ItemsCollection):
 class Track(Item):
     api_method = track.get
     label = 'track'
+    code_key = 'trackCode'
 
 
 class Tracks(ItemsCollection):
@@ -163,6 +340,206 @@ class Tracks(ItemsCollection):
     label = 'tracks'
 
 
+class CompactItem(object):
+    """ A memory efficient, read only version of :py:class:`Item`, for
+    keeping large amounts of entities in memory. Values are stored in
+    ``__slots__`` derived from :py:attr:`fields`, the keys usually found in
+    the response messages, so that no per-object :py:class:`dict` is needed;
+    unexpected keys are kept aside. It supports the :py:class:`dict` read
+    API, and compares equal to the corresponding :py:class:`Item`.
+    >>> t = CompactTrack(trackCode=1, name='One', mood='sad')
+    >>> t
+    CompactTrack(trackCode = 1, name = 'One', mood = 'sad')
+    >>> t['name'], t.get('duration'), 'mood' in t
+    ('One', None, True)
+    >>> t == Track(trackCode=1, name='One', mood='sad') == t.toItem()
+    True
+    """
+    __slots__ = ('_extra',)
+    item_type = Item
+    label = None
+    code_key = None
+    fields = ()
+    _fields = frozenset()
+
+    def __init__(self, **kwargs):
+        if self.label in kwargs:
+            kwargs = dict(self.item_type(**kwargs))
+        # Every slot is set, to _Missing if absent: the values are moved out
+        # of kwargs by C loops rather than one key at a time.
+        _fill(self, map(kwargs.pop, self.fields,
+                        repeat(_Missing, len(self.fields))))
+        extra = None
+        for key, value in kwargs.iteritems():
+            if isinstance(value, ItemsCollection):
+                value = tuple(item.compact() for item in value)
+            if extra is None:
+                extra = dict()
+            extra[intern(str(key))] = value
+        object.__setattr__(self, '_extra', extra)
+
+    @classmethod
+    def fromItem(cls, item):
+        """ Builds a compact item out of an :py:class:`Item`."""
+        return cls(**item)
+
+    def toItem(self):
+        """ Returns the equivalent :py:class:`Item`, nested collections
+        included.
+        >>> album = Album(albumCode=1, tracks=Tracks({'trackCode': 2}))
+        >>> album.compact()['tracks']
+        (CompactTrack(trackCode = 2),)
+        >>> album.compact().toItem()['tracks']
+        Tracks(Track(trackCode = 2))
+        """
+        kwargs = dict(self.iteritems())
+        for key, value in (self._extra or {}).iteritems():
+            if key in LABEL2CLS and isinstance(value, tuple):
+                kwargs[key] = LABEL2CLS[key](*[i.toItem() for i in value])
+        return self.item_type(**kwargs)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is read only' % type(self).__name__)
+
+    def __reduce__(self):
+        """ Compact items are pickled as the tuple of their slot values, with
+        no key names.
+        >>> import cPickle
+        >>> cPickle.loads(cPickle.dumps(CompactTrack(trackCode=1, mood='sad'), 2))
+        CompactTrack(trackCode = 1, mood = 'sad')
+        """
+        return (_compact, (type(self), tuple(self._values()), self._extra))
+
+    def _values(self):
+        return map(getattr, repeat(self, len(self.fields)), self.fields)
+
+    def iteritems(self):
+        for key in self.fields:
+            value = getattr(self, key)
+            if value is not _Missing:
+                yield key, value
+        if self._extra:
+            for item in self._extra.iteritems():
+                yield item
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is _Missing:
+                raise KeyError(key)
+            return value
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    has_key = __contains__
+
+    def iterkeys(self):
+        return (k for k, v in self.iteritems())
+
+    def itervalues(self):
+        return (v for k, v in self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    __iter__ = iterkeys
+
+    def __len__(self):
+        return len(self.items())
+
+    def __nonzero__(self):
+        for value in self.itervalues():
+            return True
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactItem, dict)):
+            return dict(self.iteritems()) == dict(other.iteritems())
+        return NotImplemented
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = Item.__hash__.im_func
+    __repr__ = Item.__repr__.im_func
+
+
+class _Missing(object):
+    """ The value of the empty slots of a :py:class:`CompactItem`."""
+
+
+def _fill(compact, values):
+    fields = compact.fields
+    map(object.__setattr__, repeat(compact, len(fields)), fields, values)
+
+
+def _compact(cls, values, extra):
+    compact = object.__new__(cls)
+    _fill(compact, values)
+    object.__setattr__(compact, '_extra', extra)
+    return compact
+
+
+def _slots(fields):
+    return tuple(intern(f) for f in fields)
+
+
+class CompactArtist(CompactItem):
+    item_type = Artist
+    label = Artist.label
+    code_key = Artist.code_key
+    fields = __slots__ = _slots(('artistCode', 'name', 'country', 'image',
+                                 'genre', 'url'))
+    _fields = frozenset(fields)
+
+
+class CompactAlbum(CompactItem):
+    item_type = Album
+    label = Album.label
+    code_key = Album.code_key
+    fields = __slots__ = _slots(('albumCode', 'name', 'artistCode',
+                                 'artistName', 'country', 'image', 'genre',
+                                 'releaseDate', 'url'))
+    _fields = frozenset(fields)
+
+
+class CompactTrack(CompactItem):
+    item_type = Track
+    label = Track.label
+    code_key = Track.code_key
+    fields = __slots__ = _slots(('trackCode', 'name', 'albumCode',
+                                 'albumName', 'artistCode', 'artistName',
+                                 'country', 'duration', 'trackNumber',
+                                 'genre', 'url'))
+    _fields = frozenset(fields)
+
+
+Item.compact_type = None
+Artist.compact_type = CompactArtist
+Album.compact_type = CompactAlbum
+Track.compact_type = CompactTrack
+
+
 ENTITIES = (Artist, Artists, Album, Albums, Track, Tracks)
 CLS2LABEL = dict([(e, e.label) for e in ENTITIES])
 LABEL2CLS = dict([(v,k) for k,v in CLS2LABEL.items()])
@@ -0,0 +1,166 @@
+"""This module instruments the API calls performed by
+:py:class:`playme.core.Request`, enabled by assigning a :py:class:`Metrics`
+to :py:attr:`playme.core.Request.metrics`::
+
+    import playme.core, playme.metrics
+    metrics = playme.core.Request.metrics = playme.metrics.Metrics()
+    ...
+    metrics.snapshot()['artist.get']['latency']['p99']
+
+For every API method it counts calls, response statuses, network errors and
+received bytes, both as sent over the network and decoded, and keeps a
+latency histogram. :py:meth:`Metrics.snapshot` returns them as plain python
+data, ready to be fed to any exporter. Hooks can be registered to run before
+and after every call.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import threading
+import time
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           float('inf'))
+"""Default latency histogram buckets upper bounds, in seconds."""
+
+
+class Histogram(object):
+    """A fixed buckets histogram.
+
+    >>> from playme.metrics import Histogram
+    >>> h = Histogram((0.1, 1, float('inf')))
+    >>> for value in (0.05, 0.05, 0.5, 3):
+    ...     h.add(value)
+    >>> h.count, h.sum
+    (4, 3.6)
+    >>> h.quantile(0.5), h.quantile(0.99)
+    (0.1, inf)
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        """The upper bound of the bucket holding the **fraction** quantile."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': zip(self.buckets, self.counts),
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class MethodMetrics(object):
+    """The counters of a single API method."""
+    def __init__(self, buckets=BUCKETS):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.wire_bytes = 0
+        self.statuses = dict()
+        self.latency = Histogram(buckets)
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'wire_bytes': self.wire_bytes,
+            'statuses': dict(self.statuses),
+            'latency': self.latency.snapshot(),
+        }
+
+
+class Metrics(object):
+    """Collects :py:class:`MethodMetrics` by API method, and runs the
+    registered hooks around every call: **before** hooks get the
+    :py:class:`playme.core.Request`, **after** hooks get the request, the
+    :py:class:`playme.core.Response` (None if the call failed) and the
+    elapsed seconds.
+
+    >>> from playme.core import Request, Response
+    >>> from playme.metrics import Metrics
+    >>> metrics = Metrics()
+    >>> metrics.after.append(lambda req, resp, elapsed: resp.status)
+    >>> request = Request('artist.get', artistCode=1)
+    >>> response = metrics.call(request, lambda: Response('{"response": {}}'))
+    >>> s = metrics.snapshot()['artist.get']
+    >>> s['calls'], s['statuses'], s['latency']['count']
+    (1, {200: 1}, 1)
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.before = list()
+        self.after = list()
+        self._methods = dict()
+        self._lock = threading.Lock()
+
+    def call(self, request, func):
+        """Runs ``func()``, which performs **request** and returns its
+        :py:class:`playme.core.Response`, measuring it."""
+        for hook in self.before:
+            hook(request)
+        start = time.time()
+        response = None
+        try:
+            response = func()
+            return response
+        finally:
+            elapsed = time.time() - start
+            self.record(request, response, elapsed)
+            for hook in self.after:
+                hook(request, response, elapsed)
+
+    def record(self, request, response, elapsed):
+        """Accounts a call of **request**, that lasted **elapsed** seconds,
+        and returned **response**, or None if it failed."""
+        method = str(request.method)
+        with self._lock:
+            try:
+                counters = self._methods[method]
+            except KeyError:
+                counters = self._methods[method] = MethodMetrics(self.buckets)
+            counters.calls += 1
+            counters.latency.add(elapsed)
+            if response is None:
+                counters.errors += 1
+                return
+            status = int(response.status)
+            counters.statuses[status] = counters.statuses.get(status, 0) + 1
+            body = len(request.body or '')
+            counters.bytes += body
+            try:
+                counters.wire_bytes += int(request.headers['content-length'])
+            except (TypeError, KeyError, ValueError):
+                counters.wire_bytes += body
+
+    def snapshot(self):
+        """Returns a :py:class:`dict` mapping every API method name to its
+        counters."""
+        with self._lock:
+            return dict((m, c.snapshot()) for m, c in self._methods.items())
+
+    def reset(self):
+        """Clears all the counters."""
+        with self._lock:
+            self._methods.clear()
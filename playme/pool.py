@@ -0,0 +1,237 @@
+"""This module provides a thread-safe pool of persistent HTTP/1.1 connections,
+used by :py:class:`playme.core.Request` to talk to the playMe API host.
+
+Compressed response messages are negotiated with the *Accept-Encoding*
+header, and decoded on the fly as they are read.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import httplib
+import socket
+import threading
+import zlib
+from Queue import Queue, Empty, Full
+
+ENCODINGS = 'gzip, deflate'
+"""The *Accept-Encoding* header sent by pools with **compress** enabled."""
+
+
+class Decoder(object):
+    """Incrementally decodes a response message sent with the *gzip* or
+    *deflate* **encoding**. Both the zlib wrapped and the raw *deflate*
+    streams sent by some servers are accepted.
+
+    >>> import zlib
+    >>> from playme.pool import Decoder
+    >>> data = zlib.compress('{"response": {}}')
+    >>> decoder = Decoder('deflate')
+    >>> decoder.decompress(data[:5]) + decoder.decompress(data[5:]) + decoder.flush()
+    '{"response": {}}'
+    >>> decoder = Decoder('deflate')
+    >>> decoder.decompress(data[2:-4]) + decoder.flush()
+    '{"response": {}}'
+    """
+    def __init__(self, encoding):
+        self.encoding = encoding
+        # 32 + MAX_WBITS detects either the gzip or the zlib header.
+        self._decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        self._started = False
+
+    def decompress(self, data):
+        if self._started or not data:
+            return self._decompressor.decompress(data)
+        self._started = True
+        try:
+            return self._decompressor.decompress(data)
+        except zlib.error:
+            if self.encoding != 'deflate':
+                raise
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompressor.decompress(data)
+
+    def flush(self):
+        return self._decompressor.flush()
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of keep-alive :py:class:`httplib.HTTPConnection` to
+    a single host. A connection is borrowed for one request and given back as
+    soon as the response body has been read, so the next request reuses the
+    open socket instead of paying a new DNS lookup and TCP handshake.
+
+    At most **size** idle connections are kept: when every pooled connection
+    is busy a new one is opened, and discarded afterwards if the pool is full.
+
+    Unless **compress** is False, gzip and deflate encoded response messages
+    are accepted, and returned decoded. :py:attr:`wire_bytes` and
+    :py:attr:`decoded_bytes` count the response message bytes received from
+    the network and returned after decoding.
+
+    >>> from playme.pool import ConnectionPool
+    >>> pool = ConnectionPool('api.playme.com', size=4)
+    >>> pool
+    ConnectionPool('api.playme.com', port=80, size=4)
+    >>> pool.url('/album.get?albumCode=1')
+    'http://api.playme.com/album.get?albumCode=1'
+    >>> ConnectionPool('localhost', 8080).url('/album.get')
+    'http://localhost:8080/album.get'
+    """
+    connection_class = httplib.HTTPConnection
+    decoder_class = Decoder
+
+    def __init__(self, host, port=80, size=10,
+                 timeout=socket._GLOBAL_DEFAULT_TIMEOUT, compress=True):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self.compress = compress
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self._idle = Queue(size)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'ConnectionPool(%r, port=%i, size=%i)' % (
+            self.host, self.port, self.size)
+
+    @property
+    def netloc(self):
+        """The *host[:port]* part of the URLs served by this pool."""
+        if self.port == 80:
+            return self.host
+        return '%s:%i' % (self.host, self.port)
+
+    def url(self, path):
+        """Returns the absolute URL of **path** on this pool's host."""
+        return 'http://%s%s' % (self.netloc, path)
+
+    def _get(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            connection = self._idle.get_nowait()
+        except Empty:
+            return self.connection_class(self.host, self.port,
+                                         timeout=timeout)
+        # The timeout of a pooled connection may have been changed by the
+        # previous call.
+        connection.timeout = timeout
+        if connection.sock is not None:
+            if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+                timeout = socket.getdefaulttimeout()
+            connection.sock.settimeout(timeout)
+        return connection
+
+    def _put(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except Full:
+            connection.close()
+
+    def _headers(self, headers):
+        headers = dict(headers or ())
+        if self.compress:
+            headers.setdefault('Accept-Encoding', ENCODINGS)
+        return headers
+
+    def _decoder(self, response):
+        encoding = (response.getheader('content-encoding') or '').lower()
+        if encoding in ('gzip', 'x-gzip', 'deflate'):
+            return self.decoder_class(encoding.replace('x-', ''))
+
+    def _account(self, wire, decoded):
+        with self._lock:
+            self.wire_bytes += wire
+            self.decoded_bytes += decoded
+
+    def clear(self):
+        """Closes every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+    def urlopen(self, path, headers=None, timeout=None):
+        """Performs a GET request for **path** and returns a
+        ``(status, headers, body)`` tuple, where *headers* is a
+        :py:class:`dict` with lower case names. The *body* is decoded, while
+        the *content-length* header is the number of bytes received.
+
+        Every socket operation waits at most **timeout** seconds, the pool
+        :py:attr:`timeout` by default, then :py:class:`socket.timeout` is
+        raised. An idle connection may have been closed by the server in the
+        meantime: in that case the request is retried once on a fresh
+        connection.
+        """
+        headers = self._headers(headers)
+        for attempt in (1, 2):
+            connection = self._get(timeout)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, socket.error) as e:
+                connection.close()
+                if attempt == 2 or isinstance(e, socket.timeout):
+                    raise
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self._put(connection)
+            received = dict(response.getheaders())
+            received['content-length'] = str(len(body))
+            wire, decoder = len(body), self._decoder(response)
+            if decoder is not None:
+                body = decoder.decompress(body) + decoder.flush()
+            self._account(wire, len(body))
+            return response.status, received, body
+
+    def stream(self, path, headers=None, chunk_size=8192, timeout=None):
+        """Performs a GET request for **path** and returns a generator of the
+        response body chunks, at most **chunk_size** bytes each. The
+        connection goes back to the pool once the body has been consumed,
+        and it's closed if the generator is abandoned before. Compressed
+        chunks are decoded as they arrive. **timeout** applies to every
+        socket operation, like in :py:meth:`urlopen`.
+        """
+        headers = self._headers(headers)
+        for attempt in (1, 2):
+            connection = self._get(timeout)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                break
+            except (httplib.HTTPException, socket.error) as e:
+                connection.close()
+                if attempt == 2 or isinstance(e, socket.timeout):
+                    raise
+        decoder = self._decoder(response)
+        wire = decoded = 0
+        try:
+            chunk = response.read(chunk_size)
+            while chunk:
+                wire += len(chunk)
+                if decoder is not None:
+                    chunk = decoder.decompress(chunk)
+                decoded += len(chunk)
+                if chunk:
+                    yield chunk
+                chunk = response.read(chunk_size)
+            if decoder is not None:
+                chunk = decoder.flush()
+                decoded += len(chunk)
+                if chunk:
+                    yield chunk
+        except:
+            connection.close()
+            raise
+        finally:
+            self._account(wire, decoded)
+        if response.will_close:
+            connection.close()
+        else:
+            self._put(connection)
@@ -0,0 +1,164 @@
+"""This module provides a client side rate limiter for
+:py:class:`playme.core.Request`, enabled by assigning it to
+:py:attr:`playme.core.Request.rate_limiter`::
+
+    import playme.core, playme.ratelimit
+    playme.core.Request.rate_limiter = playme.ratelimit.RateLimiter(rate=5)
+
+Calls are spaced by token buckets, one for each apikey and API method. When
+the API answers *Temporarily blocked* (:py:class:`playme.core.ResponseStatus`
+14034) the bucket halves its rate, pauses for a jittered, growing delay and
+retries the call; then every successful call slowly ramps the rate back up
+to the configured one.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import random
+import threading
+import time
+
+from playme import core
+
+BLOCKED = 14034
+
+
+class TokenBucket(object):
+    """A thread-safe token bucket releasing **rate** calls per second, with
+    bursts of at most **burst** calls. Blocked calls pause it for **pause**
+    seconds, doubling up to **max_pause**.
+
+    >>> from playme.ratelimit import TokenBucket
+    >>> bucket = TokenBucket(10, min_rate=1)
+    >>> started = bucket.acquire()
+    >>> bucket.backoff(started); bucket.rate
+    5.0
+    >>> bucket.backoff(started); bucket.rate, bucket.blocked
+    (5.0, 1)
+    >>> from playme.core import deadline
+    >>> with deadline(0.1):
+    ...     bucket.acquire()
+    Traceback (most recent call last):
+        ...
+    TimeoutError: Deadline exceeded waiting for the rate limit
+    >>> bucket.recover(); bucket.rate
+    5.1
+    """
+    def __init__(self, rate, burst=None, min_rate=0.1, ramp=0.01, pause=1.0,
+                 max_pause=60.0):
+        self.max_rate = self.rate = float(rate)
+        self.burst = burst or max(1, int(rate))
+        self.min_rate = min_rate
+        self.ramp = ramp
+        self.pause = pause
+        self.max_pause = max_pause
+        self.tokens = self.burst
+        self.blocked = 0
+        self._updated = time.time()
+        self._resume = 0
+        self._blocked_at = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'TokenBucket(%r, burst=%i)' % (self.rate, self.burst)
+
+    def acquire(self):
+        """Blocks until a call is allowed, and returns the time it was.
+        Raises :py:class:`playme.core.TimeoutError` at once if that's past
+        the :py:func:`playme.core.deadline` of the caller."""
+        left = core.time_left()
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max((1 - self.tokens) / self.rate, self._resume - now)
+            if left is not None and wait > left:
+                raise core.TimeoutError(
+                    'Deadline exceeded waiting for the rate limit')
+            self.tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        return max(now, now + wait)
+
+    def backoff(self, started=None):
+        """Halves the rate, and pauses the bucket for a jittered delay which
+        doubles on every consecutive block, up to :py:attr:`max_pause`. A
+        call **started**, as returned by :py:meth:`acquire`, before the
+        bucket was last paused is blocked by the same episode: it doesn't
+        back off again."""
+        with self._lock:
+            if started is not None and started <= self._blocked_at:
+                return
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            delay = self.pause * 2 ** min(self.blocked, 32)
+            delay = min(self.max_pause, delay * random.uniform(0.5, 1.5))
+            self._blocked_at = time.time()
+            self._resume = self._blocked_at + delay
+            self.blocked += 1
+
+    def recover(self):
+        """Raises the rate by a small fraction of the configured one."""
+        with self._lock:
+            self.blocked = 0
+            self.rate = min(self.max_rate,
+                            self.rate + self.max_rate * self.ramp)
+
+
+class RateLimiter(object):
+    """Keeps a :py:class:`TokenBucket` for each apikey and API method pair.
+
+    **rate** is the default number of calls per second, while **rates** maps
+    an API method name, an apikey, or an *(apikey, method)* tuple to its own
+    rate; the most specific one wins. A blocked call is retried at most
+    **retries** times. Other keyword arguments are passed to the buckets.
+
+    >>> from playme.core import Request
+    >>> from playme.ratelimit import RateLimiter
+    >>> limiter = RateLimiter(rate=10, rates={'k': 5, 'artist.get': 2})
+    >>> limiter.bucket(Request('artist.get', apikey='k'))
+    TokenBucket(2.0, burst=2)
+    >>> limiter.bucket(Request('album.get', apikey='k'))
+    TokenBucket(5.0, burst=5)
+    >>> limiter.bucket(Request('album.get', apikey='other'))
+    TokenBucket(10.0, burst=10)
+    """
+    def __init__(self, rate=10, rates=None, retries=3, **kwargs):
+        self.rate = rate
+        self.rates = rates or dict()
+        self.retries = retries
+        self.options = kwargs
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    def rate_for(self, apikey, method):
+        """The configured rate for **method** calls made with **apikey**."""
+        for key in ((apikey, method), method, apikey):
+            if key in self.rates:
+                return self.rates[key]
+        return self.rate
+
+    def bucket(self, request):
+        """The :py:class:`TokenBucket` used by **request**."""
+        apikey = request.data.get('apikey')
+        key = (apikey, str(request.method))
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(
+                    self.rate_for(*key), **self.options)
+            return self._buckets[key]
+
+    def call(self, request, func):
+        """Returns the :py:class:`playme.core.Response` returned by ``func()``
+        as soon as the bucket of **request** allows it, retrying while the
+        API answers *Temporarily blocked*."""
+        bucket = self.bucket(request)
+        for attempt in xrange(self.retries + 1):
+            started = bucket.acquire()
+            response = func()
+            if response.status != BLOCKED:
+                bucket.recover()
+                break
+            bucket.backoff(started)
+        return response
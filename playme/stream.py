@@ -0,0 +1,164 @@
+"""This module parses response messages incrementally, while they are being
+received, yielding the items of a collection one by one instead of building
+the whole :py:class:`playme.core.Response` and
+:py:class:`playme.item.ItemsCollection` first. It lowers both the peak memory
+and the time to the first item on large search results::
+
+    from playme.api import artist
+    from playme.item import Artists
+    for a in Artists.stream(artist.searchByName, query='Metallica', country='us'):
+        print a['name']
+
+Items are deduplicated and cast like :py:class:`playme.item.ItemsCollection`
+does.
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import json
+
+from playme import core
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER = '0123456789.eE+-'
+
+
+class JsonStream(object):
+    """A minimal pull parser over an iterable of json text **chunks**, able
+    to walk objects and arrays and to decode single values as soon as they
+    have been completely received.
+
+    >>> from playme.stream import JsonStream
+    >>> s = JsonStream(['{"a": [1, 2', '3, {"b"', ': 4}], "c": 5}'])
+    >>> [(k, list(s.iter_array()) if k == 'a' else s.value())
+    ...  for k in s.iter_object()]
+    [(u'a', [1, 23, {u'b': 4}]), (u'c', 5)]
+    >>> s = JsonStream(['{"a": 12.', '5, "b": 1', 'e', '-2, "c": -', '3}'])
+    >>> [(k, s.value()) for k in s.iter_object()]
+    [(u'a', 12.5), (u'b', 0.01), (u'c', -3)]
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ''
+        self._pos = 0
+        self._exhausted = False
+
+    def _fill(self):
+        if self._exhausted:
+            raise core.ResponseError(u'Invalid Json response message.')
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._exhausted = True
+            return
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+
+    def _peek(self):
+        while True:
+            while (self._pos < len(self._buffer) and
+                   self._buffer[self._pos] in _WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            self._fill()
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise core.ResponseError(u'Invalid Json response message.')
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Decodes the next value."""
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                end = None
+            # A number could go on in the next chunk, e.g. '12.' and '5':
+            # make sure it doesn't.
+            if end is not None and (self._exhausted or (
+                    end < len(self._buffer) and
+                    not (isinstance(value, (int, long, float)) and
+                         self._buffer[end] in _NUMBER))):
+                self._pos = end
+                return value
+            self._fill()
+
+    def iter_array(self):
+        """Yields the values of the next array, decoding them one by one."""
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self._expect(',]') == ']':
+                return
+
+    def iter_object(self):
+        """Yields the keys of the next object. The caller must consume each
+        key's value, either by :py:meth:`value` or :py:meth:`iter_array`,
+        before asking for the next key."""
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+
+def iter_items(cls, chunks):
+    """Yields the items of the :py:class:`playme.item.ItemsCollection`
+    subclass **cls** found in the response message **chunks**. Raises
+    :py:class:`playme.core.Error` if the message reports an error.
+
+    >>> from playme.item import Artists
+    >>> from playme.stream import iter_items
+    >>> chunks = ['{"response": {"artists": [{"artist": {"artistCode": 1}},',
+    ...           ' {"artistCode": 2}, {"artistCode": 1}]}}']
+    >>> list(iter_items(Artists, chunks))
+    [Artist(artistCode = 1), Artist(artistCode = 2)]
+    >>> list(iter_items(Artists, ['{"response": {"error": {"code": "16000"}}}']))
+    Traceback (most recent call last):
+        ...
+    Error: Search engine error
+    """
+    stream = JsonStream(chunks)
+    for key in stream.iter_object():
+        if key != 'response':
+            stream.value()
+            continue
+        for key in stream.iter_object():
+            if key == cls.label:
+                seen = set()
+                for item in stream.iter_array():
+                    item = cls._cast(item)
+                    if item and item not in seen:
+                        seen.add(item)
+                        yield item
+            elif key == 'error':
+                error = stream.value()
+                raise core.Error(str(core.ResponseStatus(int(error['code']))))
+            else:
+                stream.value()
+
+
+def stream(cls, method, **query):
+    """Calls the API **method** and yields the items of **cls** while the
+    response message is being received. The call goes through the request
+    rate limiter, if any, but neither through the cache nor the request
+    coalescing, since the message is never stored as a whole."""
+    query['format'] = 'json'
+    request = core.Request(method, query)
+    if request.rate_limiter is not None:
+        request.rate_limiter.bucket(request).acquire()
+    return iter_items(cls, request.stream())
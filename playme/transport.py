@@ -0,0 +1,125 @@
+"""This module defines how :py:class:`playme.core.Request` obtains the raw
+response messages. The transport in use is
+:py:attr:`playme.core.Request.transport`:
+
+* :py:class:`HTTPTransport` calls the API through
+  :py:attr:`playme.core.Request.pool`, as requests do when no transport is
+  set;
+* :py:class:`RecordTransport` calls the API through another transport, and
+  saves every response message to a directory;
+* :py:class:`ReplayTransport` serves the messages saved in a directory,
+  without any network access, e.g. to benchmark or reproduce production
+  traffic deterministically::
+
+    import playme.core, playme.transport
+    playme.core.Request.transport = playme.transport.RecordTransport('traffic')
+    ...
+    playme.core.Request.transport = playme.transport.ReplayTransport('traffic')
+"""
+import playme
+__license__, __author__ = playme.__license__, playme.__author__
+
+import hashlib
+import os
+import tempfile
+from httplib import OK
+from urllib import urlencode
+
+from playme import core
+
+
+class Transport(object):
+    """Base class for transports."""
+    def urlopen(self, request, headers=None, timeout=None):
+        """Performs **request**, waiting at most **timeout** seconds if
+        given, and returns a ``(status, headers, body)`` tuple, like
+        :py:meth:`playme.pool.ConnectionPool.urlopen`."""
+        raise NotImplementedError(type(self).__name__ + '.urlopen')
+
+    def stream(self, request, headers=None, timeout=None):
+        """Performs **request** and returns an iterable of the response
+        message chunks."""
+        return [self.urlopen(request, headers, timeout)[2]]
+
+
+class HTTPTransport(Transport):
+    """Calls the API through the request's
+    :py:class:`playme.pool.ConnectionPool`."""
+    def urlopen(self, request, headers=None, timeout=None):
+        return request.pool.urlopen(request.path, headers, timeout)
+
+    def stream(self, request, headers=None, timeout=None):
+        return request.pool.stream(request.path, headers, timeout=timeout)
+
+
+class ReplayTransport(Transport):
+    """Serves the response messages saved in **directory**, one file for
+    each request, named after the API method and a digest of its query
+    string, apikey excluded. Raises :py:class:`playme.core.Error` for
+    requests never recorded.
+
+    >>> import os, shutil, tempfile
+    >>> from playme.core import Request
+    >>> from playme.transport import ReplayTransport
+    >>> directory = tempfile.mkdtemp()
+    >>> replay = ReplayTransport(directory)
+    >>> request = Request('artist.get', artistCode=1)
+    >>> replay.save(request, '{"response": {}}')
+    >>> os.path.basename(replay.filename(request))
+    'artist.get-071499b1ac15c82a.json'
+    >>> replay.urlopen(request)
+    (200, {}, '{"response": {}}')
+    >>> replay.urlopen(Request('artist.get', artistCode=2))
+    Traceback (most recent call last):
+        ...
+    Error: Request not recorded: Request(Method('artist.get'), QueryString({'artistCode': '2'}))
+    >>> shutil.rmtree(directory)
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def filename(self, request):
+        """The file holding the response message of **request**."""
+        query = sorted((k, v) for k, v in request.data.items()
+                       if k != 'apikey')
+        digest = hashlib.md5(urlencode(query)).hexdigest()[:16]
+        return os.path.join(self.directory, '%s-%s.json' % (
+            request.method, digest))
+
+    def urlopen(self, request, headers=None, timeout=None):
+        try:
+            with open(self.filename(request), 'rb') as message:
+                return 200, dict(), message.read()
+        except IOError:
+            raise core.Error('Request not recorded: %r' % request)
+
+    def save(self, request, body):
+        """Saves **body** as the response message of **request**."""
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as message:
+            message.write(body)
+        os.rename(temp, self.filename(request))
+
+
+class RecordTransport(ReplayTransport):
+    """Performs the requests through **transport**, an
+    :py:class:`HTTPTransport` by default, and saves every response message
+    received with an HTTP OK status to **directory**, so that it can be
+    served by a :py:class:`ReplayTransport` later.
+    """
+    def __init__(self, directory, transport=None):
+        super(RecordTransport, self).__init__(directory)
+        self.transport = transport or HTTPTransport()
+
+    def urlopen(self, request, headers=None, timeout=None):
+        status, headers, body = self.transport.urlopen(request, headers,
+                                                       timeout)
+        if status == OK:
+            self.save(request, body)
+        return status, headers, body